@@ -0,0 +1,165 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import networkx as nx
+import numpy as np
+
+import stubbornness_charisma
+import triadic_closure
+
+SUITES = {
+    'triadic-closure': triadic_closure.BENCHMARKS,
+    'stubbornness-charisma': stubbornness_charisma.BENCHMARKS,
+}
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+def get_meta() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'networkx': nx.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+    }
+
+def calibrate(repeat = 3) -> float:
+    # Min seconds of a fixed mix of interpreter and numpy work. Timings are
+    # compared relative to it, so that a machine running slower as a whole
+    # (shared or throttled CPUs) does not show up as a regression.
+    A = np.random.default_rng(0).random((128, 128))
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        total = 0
+        for i in range(100000):
+            total += i & 7
+        for _ in range(20):
+            A = np.tanh(A @ A.T / 128)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def time_benchmark(setup, size, seed, repeat) -> list[float]:
+    # Seconds of every repetition, each on a fresh setup with the same seed
+    times = []
+    for _ in range(repeat):
+        run = setup(size, seed)
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return times
+
+def run_benchmarks(suites, pattern=None, quick=False, repeat=5, seed=0) -> dict:
+    # 'suite/name/size' -> timings, with a calibration run just before each
+    # (see calibrate). quick leaves out the largest size.
+    results = {}
+    for suite in suites:
+        for name, (sizes, setup) in SUITES[suite].items():
+            if pattern is not None and pattern not in name:
+                continue
+            for size in (sizes[:-1] if quick else sizes):
+                key = f"{suite}/{name}/{size}"
+                calibration = calibrate()
+                times = time_benchmark(setup, size, seed, repeat)
+                results[key] = {'min': min(times), 'median': statistics.median(times), 'times': times,
+                                'calibration': calibration}
+                print(f"{key}: min {min(times):.6f}s, median {statistics.median(times):.6f}s", file=sys.stderr)
+    return results
+
+def compare(results, baseline, threshold) -> list[str]:
+    # Prints the median times against the baseline, returns the keys that got
+    # slower by more than the threshold factor. Ratios are divided by the
+    # ratio of the median calibration runs of both, over the benchmarks they
+    # share (a single calibration run is too noisy), and the threshold is
+    # raised by the spread (upper quartile / median) of the baseline
+    # repetitions, which is large for the noisy benchmarks. Medians, as the
+    # min of a few repetitions depends on whether a rare fast one was among
+    # them.
+    regressions = []
+    shared = [key for key in results if 'calibration' in baseline.get(key, {})]
+    speed = 1.0
+    if shared:
+        speed = (statistics.median(results[key]['calibration'] for key in shared) /
+                 statistics.median(baseline[key]['calibration'] for key in shared))
+        print(f"Calibration: this machine runs at {1 / speed:.2f}x the speed of the baseline")
+    print(f"{'benchmark':<60} {'baseline':>10} {'current':>10} {'ratio':>7} {'limit':>7}")
+    for key, result in results.items():
+        if key not in baseline:
+            print(f"{key:<60} {'-':>10} {result['median']:>10.6f} {'new':>7}")
+            continue
+        base = baseline[key]
+        ratio = result['median'] / base['median'] / (speed if 'calibration' in base else 1.0)
+        limit = threshold * statistics.quantiles(base['times'], n=4)[2] / base['median']
+        flag = ''
+        if ratio > limit:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print(f"{key:<60} {base['median']:>10.6f} {result['median']:>10.6f} {ratio:>7.2f} {limit:>7.2f}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Times the hot paths of both models with fixed seeds')
+    parser.add_argument('--suite', nargs='+', choices=list(SUITES), default=list(SUITES))
+    parser.add_argument('--filter', default=None, help='Only benchmarks whose name contains this')
+    parser.add_argument('--quick', action='store_true', help='Leave out the largest size of every benchmark')
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help='JSON file for the results')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Results JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results to --baseline instead of comparing')
+    parser.add_argument('--threshold', type=float, default=1.25, help='Slowdown factor flagged as a regression')
+    args = parser.parse_args()
+
+    report = {
+        'meta': get_meta(),
+        'config': {'quick': args.quick, 'repeat': args.repeat, 'seed': args.seed},
+        'results': run_benchmarks(args.suite, args.filter, args.quick, args.repeat, args.seed),
+    }
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        # Merge, so that a filtered run only replaces its own entries
+        baseline = {'results': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline['meta'] = report['meta']
+        baseline['results'].update(report['results'])
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline first", file=sys.stderr)
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    # Timings only compare on the machine and versions that recorded them
+    changed = [key for key in ('python', 'numpy', 'networkx', 'machine', 'processor', 'cpus')
+               if baseline.get('meta', {}).get(key) != report['meta'][key]]
+    if changed:
+        print(f"Baseline was recorded with a different {', '.join(changed)}, record a new one with --save-baseline",
+              file=sys.stderr)
+    regressions = compare(report['results'], baseline['results'], args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold}x", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,84 @@
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'stubbornness-charisma'))
+
+from bases import World, Voter
+from generators import UniformVoter, FixedCandidate
+from votingrules import PluralityVoting
+
+# Every setup takes the size V and a seed and returns the function to time,
+# on a fresh state per repetition
+
+C = 4
+
+def make_world(V, seed, soa) -> World:
+    # Object worlds draw from the global random states (networkx uses random)
+    random.seed(seed)
+    np.random.seed(seed)
+    world = World(V, C, PluralityVoting(), soa=soa)
+    world.generate_candidates(FixedCandidate(C))
+    world.generate_voters(UniformVoter(), np.random.default_rng(seed))
+    return world
+
+def setup_generate_voters(V, seed):
+    world = World(V, C, PluralityVoting())
+
+    def run():
+        random.seed(seed)
+        np.random.seed(seed)
+        world.generate_voters(UniformVoter())
+    return run
+
+def setup_generate_voters_soa(V, seed):
+    world = World(V, C, PluralityVoting(), soa=True)
+    return lambda: world.generate_voters(UniformVoter(), np.random.default_rng(seed))
+
+def setup_plurality(V, seed):
+    # 10 full counts of an opinion array
+    rng = np.random.default_rng(seed)
+    opinions = rng.uniform(0, 1, V)
+    candidates = FixedCandidate(C).create_batch(C)
+    rule = PluralityVoting()
+
+    def run():
+        for _ in range(10):
+            rule.get_voting_result(opinions, candidates)
+    return run
+
+def setup_plurality_objects(V, seed):
+    rng = np.random.default_rng(seed)
+    voters = [Voter(i, x, 0.5, 0.5) for i, x in enumerate(rng.uniform(0, 1, V).tolist())]
+    candidates = FixedCandidate(C).create_batch(C)
+    rule = PluralityVoting()
+
+    def run():
+        for _ in range(10):
+            rule.get_voting_result(voters, candidates)
+    return run
+
+def setup_edge_adjustment(V, seed, soa = True):
+    # 1000 perform_edge_adjustment steps of 20 edges
+    world = make_world(V, seed, soa)
+    rng = np.random.default_rng(seed)
+
+    def run():
+        for _ in range(1000):
+            world.perform_edge_adjustment(20, rng)
+    return run
+
+def setup_edge_adjustment_objects(V, seed):
+    return setup_edge_adjustment(V, seed, soa=False)
+
+# name -> (sizes, setup)
+BENCHMARKS = {
+    'generate_voters': ((100, 1000, 10000), setup_generate_voters),
+    'generate_voters_soa': ((1000, 10000, 100000, 1000000), setup_generate_voters_soa),
+    'plurality_voting': ((1000, 10000, 100000, 1000000), setup_plurality),
+    'plurality_voting_objects': ((100, 1000, 10000), setup_plurality_objects),
+    'edge_adjustment': ((1000, 10000, 100000, 1000000), setup_edge_adjustment),
+    'edge_adjustment_objects': ((100, 1000, 10000), setup_edge_adjustment_objects),
+}
\ No newline at end of file
@@ -0,0 +1,153 @@
+import os
+import sys
+
+import networkx.generators.random_graphs as r_graphs
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'triadic-closure'))
+
+from base import NoFlipUniverse
+from ensemble import UniverseEnsemble
+from matrix_base import MatrixNoFlipUniverse, MatrixForceFlipUniverse
+from packed_base import PackedNoFlipUniverse, PackedForceFlipUniverse
+
+# Every setup takes the size n and a seed and returns the function to time,
+# on a fresh state per repetition
+
+# p_favor_e of the ForceFlip universes
+ENEMY_PRIORITY = 0.5
+
+def make_universe(n, seed) -> NoFlipUniverse:
+    rng = np.random.default_rng(seed)
+    G = r_graphs.erdos_renyi_graph(n, 0.5, seed=rng)
+    return NoFlipUniverse(G, rng)
+
+def make_matrix_universe(n, seed, force_flip = False) -> MatrixNoFlipUniverse:
+    rng = np.random.default_rng(seed)
+    G = r_graphs.erdos_renyi_graph(n, 0.5, seed=rng)
+    if force_flip:
+        return MatrixForceFlipUniverse(G, ENEMY_PRIORITY, rng)
+    return MatrixNoFlipUniverse(G, rng)
+
+def make_packed_universe(n, seed, force_flip = False, track_rows = False) -> PackedNoFlipUniverse:
+    rng = np.random.default_rng(seed)
+    if force_flip:
+        return PackedForceFlipUniverse.from_random(n, 0.5, ENEMY_PRIORITY, rng=rng, track_rows=track_rows)
+    return PackedNoFlipUniverse.from_random(n, 0.5, rng=rng, track_rows=track_rows)
+
+def run_steps(step, count):
+    # count calls of step, fewer if the universe gets stable
+    def run():
+        for _ in range(count):
+            if step() is None:
+                break
+    return run
+
+def setup_init(n, seed):
+    rng = np.random.default_rng(seed)
+    G = r_graphs.erdos_renyi_graph(n, 0.5, seed=rng)
+    return lambda: NoFlipUniverse(G, rng)
+
+def setup_flip_edge(n, seed):
+    # 100 flips of an edge of a random unstable triangle
+    U = make_universe(n, seed)
+
+    def run():
+        for _ in range(100):
+            tri = U.get_random_unstab_tri()
+            if tri is None:
+                break
+            U.flip_edge(tri[0], tri[1])
+    return run
+
+def setup_get_random_unstab_tri(n, seed):
+    U = make_universe(n, seed)
+
+    def run():
+        for _ in range(1000):
+            U.get_random_unstab_tri()
+    return run
+
+def setup_convergence(n, seed):
+    # transform_round until balanced, the number of rounds grows quickly with n
+    U = make_universe(n, seed)
+
+    def run():
+        while U.transform_round() is not None:
+            pass
+    return run
+
+def setup_matrix_init(n, seed):
+    rng = np.random.default_rng(seed)
+    G = r_graphs.erdos_renyi_graph(n, 0.5, seed=rng)
+    return lambda: MatrixNoFlipUniverse(G, rng)
+
+def setup_matrix_noflip_rounds(n, seed):
+    # 1000 transform_rounds
+    return run_steps(make_matrix_universe(n, seed).transform_round, 1000)
+
+def setup_matrix_forceflip_rounds(n, seed):
+    # 1000 transform_rounds, each flips an edge
+    return run_steps(make_matrix_universe(n, seed, force_flip=True).transform_round, 1000)
+
+def setup_matrix_kmc(n, seed):
+    # 100 kmc_rounds, each flips an edge
+    return run_steps(make_matrix_universe(n, seed).kmc_round, 100)
+
+def setup_matrix_sweep(n, seed):
+    # 10 sweep_rounds
+    return run_steps(make_matrix_universe(n, seed).sweep_round, 10)
+
+def setup_packed_init(n, seed):
+    # Random rows included, there is nothing else to set up
+    return lambda: make_packed_universe(n, seed)
+
+def setup_packed_noflip_rounds(n, seed):
+    return run_steps(make_packed_universe(n, seed).transform_round, 1000)
+
+def setup_packed_forceflip_rounds(n, seed):
+    return run_steps(make_packed_universe(n, seed, force_flip=True).transform_round, 1000)
+
+def setup_packed_tracked_init(n, seed):
+    # Counting the unstable edges of every row, O(n^3 / 64)
+    rng = np.random.default_rng(seed)
+    rows = PackedNoFlipUniverse.random_rows(n, 0.5, rng)
+    return lambda: PackedNoFlipUniverse(None, rng, rows=rows, n=n, track_rows=True)
+
+def setup_packed_tracked_rounds(n, seed):
+    return run_steps(make_packed_universe(n, seed, force_flip=True, track_rows=True).transform_round, 1000)
+
+def setup_ensemble_rounds(n, seed):
+    # 100 transform_rounds of 64 universes
+    E = UniverseEnsemble.from_random(64, n, 0.5, rng=np.random.default_rng(seed))
+
+    def run():
+        for _ in range(100):
+            if len(E.transform_round()) == 0:
+                break
+    return run
+
+def setup_ensemble_convergence(n, seed):
+    # 16 universes until all are balanced, as transform_round_convergence
+    E = UniverseEnsemble.from_random(16, n, 0.5, rng=np.random.default_rng(seed))
+    return E.run
+
+# name -> (sizes, setup)
+BENCHMARKS = {
+    'noflip_init': ((10, 30, 100, 300), setup_init),
+    'flip_edge': ((10, 30, 100), setup_flip_edge),
+    'get_random_unstab_tri': ((10, 30, 100), setup_get_random_unstab_tri),
+    'transform_round_convergence': ((10, 15, 20), setup_convergence),
+    'matrix_init': ((10, 30, 100, 300, 1000), setup_matrix_init),
+    'matrix_noflip_rounds': ((10, 30, 100, 300, 1000), setup_matrix_noflip_rounds),
+    'matrix_forceflip_rounds': ((10, 30, 100, 300, 1000), setup_matrix_forceflip_rounds),
+    'matrix_kmc': ((10, 30, 100, 300), setup_matrix_kmc),
+    'matrix_sweep': ((10, 30, 100, 300), setup_matrix_sweep),
+    'packed_init': ((10, 100, 1000, 10000), setup_packed_init),
+    'packed_noflip_rounds': ((10, 100, 1000, 10000), setup_packed_noflip_rounds),
+    'packed_forceflip_rounds': ((10, 100, 1000, 10000), setup_packed_forceflip_rounds),
+    'packed_tracked_init': ((10, 100, 1000, 3000), setup_packed_tracked_init),
+    'packed_tracked_rounds': ((10, 100, 1000, 3000), setup_packed_tracked_rounds),
+    'ensemble_rounds': ((10, 30, 100, 300), setup_ensemble_rounds),
+    'ensemble_convergence': ((10, 15, 20), setup_ensemble_convergence),
+}
\ No newline at end of file
@@ -1,11 +1,14 @@
 from __future__ import annotations
 from typing import List, Dict
 from abc import ABC, abstractmethod 
+import copy
 
+import networkx as nx
 import networkx.generators.random_graphs as r_graphs
 import numpy as np
 
-from votingrules import VotingRule
+from graphs import EdgeIndex, barabasi_albert_edges
+from votingrules import VotingRule, PluralityVoting, get_closest, get_result
 
 class Voter:
     def __init__(self, id, internal_opinion, charisma, stubbornness):
@@ -23,12 +26,62 @@ class Voter:
         # Implement the simplest voting rule: always vote for the candidate with the closest opinion
         closest_cand = min(candidates, key=lambda x: abs(x.internal_policy - self.expressed_opinion))
         return closest_cand      
+
+class VoterView(Voter):
+    # Voter whose attributes live in the arrays of a struct-of-arrays World
+    def __init__(self, world: World, id):
+        self.world = world
+        self.id = id
+
+    @property
+    def internal_opinion(self):
+        return self.world.internal_opinion[self.id]
+
+    @internal_opinion.setter
+    def internal_opinion(self, value):
+        self.world.internal_opinion[self.id] = value
+
+    @property
+    def expressed_opinion(self):
+        return self.world.expressed_opinion[self.id]
+
+    @expressed_opinion.setter
+    def expressed_opinion(self, value):
+        self.world.expressed_opinion[self.id] = value
+        self.world.update_vote_tally([self.id])
+
+    @property
+    def charisma(self):
+        return self.world.charisma[self.id]
+
+    @charisma.setter
+    def charisma(self, value):
+        self.world.charisma[self.id] = value
+
+    @property
+    def stubbornness(self):
+        return self.world.stubbornness[self.id]
+
+    @stubbornness.setter
+    def stubbornness(self, value):
+        self.world.stubbornness[self.id] = value
     
 class VoterFactory(ABC):
     @abstractmethod
     def create(self, id) -> Voter:
         pass
 
+    def create_batch(self, n, rng = None) -> Dict[str, np.ndarray]:
+        # internal_opinion, charisma and stubbornness arrays of voters 0..n-1,
+        # factories override this to draw them at once from rng
+        voters = [self.create(i) for i in range(n)]
+        return {name: np.array([getattr(v, name) for v in voters], dtype=np.float64)
+                for name in ('internal_opinion', 'charisma', 'stubbornness')}
+
+class ConvergenceError(RuntimeError):
+    # An iterative solver stopped before reaching its tolerance
+    pass
+
 class Candidate:
     def __init__(self, id, internal_policy):
         self.id = id
@@ -39,34 +92,394 @@ class CandidateFactory(ABC):
     def create(self, id) -> Candidate:
         pass
 
+    def create_batch(self, n, rng = None) -> List[Candidate]:
+        return [self.create(i) for i in range(n)]
 
-class World:
 
+class SimulationTrace:
+    # Snapshots of World.simulate in preallocated arrays, row i was taken after
+    # steps[i] steps: the score share of every candidate (in World.candidates
+    # order), the winner id, and the mean, variance and largest change since the
+    # previous snapshot of the expressed opinions
+    def __init__(self, size, C):
+        self.steps = np.zeros(size, dtype=np.int64)
+        self.vote_shares = np.zeros((size, C))
+        self.winners = np.full(size, -1, dtype=np.int64)
+        self.mean = np.zeros(size)
+        self.var = np.zeros(size)
+        self.max_change = np.full(size, np.nan)
+        self.size = 0
+
+    def record(self, step, shares, winner, opinions, previous):
+        i = self.size
+        self.steps[i] = step
+        self.vote_shares[i] = shares
+        self.winners[i] = winner
+        self.mean[i] = opinions.mean()
+        self.var[i] = opinions.var()
+        if previous is not None:
+            self.max_change[i] = np.abs(opinions - previous).max()
+        self.size += 1
+
+    def trim(self):
+        # Drop the rows left unused by an early stop
+        for name in ('steps', 'vote_shares', 'winners', 'mean', 'var', 'max_change'):
+            setattr(self, name, getattr(self, name)[:self.size])
+
+    def __len__(self):
+        return self.size
+
+class World:
+    # With soa the voter attributes are kept in float64 arrays indexed by node
+    # (internal_opinion, expressed_opinion, charisma, stubbornness) and voters
+    # holds VoterViews on them. The graph then comes from the vectorized
+    # graphs.barabasi_albert_edges, and G and voters are only built when used.
+    # edges is the (E, 2) array of the graph edges, kept in edge_index
+    # (graphs.EdgeIndex) which samples them and follows add_edge and
+    # remove_edge.
+    # In soa worlds, once a plurality result was asked for, the choice of
+    # every voter (vote_choices, a position in candidates) and the votes per
+    # candidate (vote_counts) are kept up to date by the World methods and the
+    # VoterView setter that change expressed opinions, which recast only the
+    # votes of the voters they touched. Object worlds count in full every
+    # time, their Voter objects may be changed directly.
     
-    def __init__(self, V, C, voting_rule: VotingRule, BA_graph_param = 3):
+    def __init__(self, V, C, voting_rule: VotingRule, BA_graph_param = 3, soa = False):
         self.V = V
         self.C = C
         self.voting_rule = voting_rule
         self.BA_graph_param = BA_graph_param
+        self.soa = soa
 
-        self.G = None
-        self.voters = None
+        self._G = None
+        self.edge_index = None
+        self._voters = None
         self.candidates = None
+        self.reset_vote_tally()
     
-    def generate_voters(self, voter_factory: VoterFactory):
+    @property
+    def edges(self):
+        return self.edge_index.edges if self.edge_index is not None else None
+
+    @edges.setter
+    def edges(self, edges):
+        self.edge_index = EdgeIndex(edges, self.V) if edges is not None else None
+
+    @property
+    def voters(self):
+        if self._voters is None and self.soa and self.edges is not None:
+            self._voters = [VoterView(self, node) for node in range(self.V)]
+        return self._voters
+
+    @voters.setter
+    def voters(self, voters):
+        self._voters = voters
+
+    @property
+    def G(self):
+        # Built from edges on first use in soa worlds and clones
+        if self._G is None and self.edges is not None:
+            G = nx.Graph()
+            G.add_nodes_from(range(self.V))
+            G.add_edges_from(self.edges.tolist())
+            for v in self.voters:
+                G.nodes[v.id]['info'] = v
+            self._G = G
+        return self._G
+
+    @G.setter
+    def G(self, G):
+        self._G = G
+
+    def generate_voters(self, voter_factory: VoterFactory, rng = None):
+        # rng is a np.random.Generator for the soa mode, the global numpy random
+        # state if None
+        self.reset_vote_tally()
+        if self.soa:
+            self._G = None
+            self.edges = barabasi_albert_edges(self.V, self.BA_graph_param, rng)
+            attributes = voter_factory.create_batch(self.V, rng)
+            self.internal_opinion = np.array(attributes['internal_opinion'], dtype=np.float64)
+            self.expressed_opinion = self.internal_opinion.copy()
+            self.charisma = np.array(attributes['charisma'], dtype=np.float64)
+            self.stubbornness = np.array(attributes['stubbornness'], dtype=np.float64)
+            self.voters = None
+            return
+
         self.G = r_graphs.barabasi_albert_graph(self.V, self.BA_graph_param)
+        self.edges = np.array(self.G.edges(), dtype=np.int64).reshape(-1, 2)
         self.voters = []
         for node in self.G.nodes():
             v = voter_factory.create(node)
             self.G.nodes[node]['info'] = v
             self.voters.append(v)
     
-    def generate_candidates(self, candidate_factory: CandidateFactory):
-        self.candidates = []
-        for i in range(self.C):
-            c = candidate_factory.create(i)
-            self.candidates.append(c)
+    def clone(self) -> World:
+        # Copy on write: the clone shares edges, candidates and internal
+        # opinions with this world and copies only the per-voter state that
+        # changes (expressed opinion, charisma, stubbornness)
+        world = copy.copy(self)
+        world._G = None
+        world.edge_index = self.edge_index.copy()
+        if self.soa:
+            world.expressed_opinion = self.expressed_opinion.copy()
+            world.charisma = self.charisma.copy()
+            world.stubbornness = self.stubbornness.copy()
+            world.voters = None
+        else:
+            world.voters = [copy.copy(v) for v in self.voters]
+        if self.vote_choices is not None:
+            world.vote_choices = self.vote_choices.copy()
+            world.vote_counts = self.vote_counts.copy()
+        return world
+    
+    def generate_candidates(self, candidate_factory: CandidateFactory, rng = None):
+        self.reset_vote_tally()
+        self.candidates = candidate_factory.create_batch(self.C, rng)
         self.candidates.sort(key=lambda x: x.internal_policy)
     
+    def reset_vote_tally(self):
+        self.vote_candidates = None
+        self.vote_policies = None
+        self.vote_choices = None
+        self.vote_counts = None
+
+    def get_vote_counts(self):
+        # Plurality votes per candidate. soa worlds count in full only when
+        # there is no tally for the current candidates yet.
+        if not self.soa:
+            policies = np.array([c.internal_policy for c in self.candidates])
+            choices = get_closest(self.get_voter_arrays()[1], policies)
+            return np.bincount(choices, minlength=len(self.candidates))
+        if self.vote_choices is None or self.vote_candidates is not self.candidates:
+            self.vote_candidates = self.candidates
+            self.vote_policies = np.array([c.internal_policy for c in self.candidates])
+            self.vote_choices = get_closest(self.get_voter_arrays()[1], self.vote_policies)
+            self.vote_counts = np.bincount(self.vote_choices, minlength=len(self.candidates))
+        return self.vote_counts
+
+    def update_vote_tally(self, nodes):
+        # Recasts the votes of nodes after their expressed opinions changed,
+        # O(len(nodes) log C). Only soa worlds keep a tally.
+        if self.vote_choices is None:
+            return
+        nodes = np.unique(nodes)
+        new = get_closest(self.expressed_opinion[nodes], self.vote_policies)
+        old = self.vote_choices[nodes]
+        moved = new != old
+        if moved.any():
+            C = len(self.vote_policies)
+            self.vote_counts += np.bincount(new[moved], minlength=C) - np.bincount(old[moved], minlength=C)
+            self.vote_choices[nodes[moved]] = new[moved]
+
     def get_voting_result(self) -> Dict:
+        if type(self.voting_rule) is PluralityVoting and self.soa:
+            # O(C log C) from the tally
+            return get_result(self.candidates, self.get_vote_counts())
+        if self.soa:
+            return self.voting_rule.get_voting_result(self.expressed_opinion, self.candidates)
         return self.voting_rule.get_voting_result(self.voters, self.candidates)
+
+    @classmethod
+    def get_independent_runs(cls, targets, sources):
+        # Splits the pairs into runs [start, end) in which no pair reads or
+        # writes an opinion written by an earlier pair of the same run
+        k = len(targets)
+        # Pairs ordered by target, then position
+        order = np.lexsort((np.arange(k), targets))
+        keys = targets[order] * k + order
+
+        def last_write(nodes):
+            # Position of the last earlier pair with target nodes[i], -1 if none
+            pos = np.searchsorted(keys, nodes * k + np.arange(k)) - 1
+            found = (pos >= 0) & (targets[order[np.maximum(pos, 0)]] == nodes)
+            return np.where(found, order[np.maximum(pos, 0)], -1)
+
+        depends_on = np.maximum(last_write(targets), last_write(sources))
+        start = 0
+        while start < k:
+            blocked = np.flatnonzero(depends_on[start + 1:] >= start)
+            end = start + 1 + blocked[0] if len(blocked) > 0 else k
+            yield start, end
+            start = end
+
+    def adjust_opinions(self, targets, sources):
+        # Voter targets[i] adjusts its opinion towards sources[i], one pair
+        # after the other as Voter.adjust_opinion
+        targets = np.asarray(targets, dtype=np.int64)
+        sources = np.asarray(sources, dtype=np.int64)
+        if not self.soa:
+            for t, s in zip(targets, sources):
+                self.voters[t].adjust_opinion(self.voters[s])
+            return
+
+        e = self.expressed_opinion
+        for start, end in self.get_independent_runs(targets, sources):
+            t, s = targets[start:end], sources[start:end]
+            ch = self.charisma[s]
+            x = (1 - ch) * e[t] + ch * e[s]
+            st = self.stubbornness[t]
+            e[t] = (1 - st) * x + st * self.internal_opinion[t]
+        self.update_vote_tally(targets)
+
+    def get_voter_arrays(self):
+        # (internal_opinion, expressed_opinion, charisma, stubbornness) arrays,
+        # copies unless soa
+        if self.soa:
+            return self.internal_opinion, self.expressed_opinion, self.charisma, self.stubbornness
+        return tuple(np.array([getattr(v, name) for v in self.voters], dtype=np.float64)
+                     for name in ('internal_opinion', 'expressed_opinion', 'charisma', 'stubbornness'))
+
+    def get_influence_matrix(self):
+        # Row-stochastic CSR matrix M of the synchronous mode: every voter moves
+        # towards each neighbor by the neighbor's charisma divided by its own
+        # degree, the diagonal keeps the rest of its own opinion. Needs scipy.
+        import scipy.sparse as sp
+        _, _, charisma, _ = self.get_voter_arrays()
+        rows = np.concatenate([self.edges[:, 0], self.edges[:, 1]])
+        cols = np.concatenate([self.edges[:, 1], self.edges[:, 0]])
+        degree = np.maximum(np.bincount(rows, minlength=self.V), 1)
+        weights = charisma[cols] / degree[rows]
+        keep = 1 - np.bincount(rows, weights=weights, minlength=self.V)
+        nodes = np.arange(self.V)
+        return sp.csr_matrix((np.concatenate([weights, keep]), (np.concatenate([rows, nodes]), np.concatenate([cols, nodes]))),
+                             shape=(self.V, self.V))
+
+    def perform_synchronous_steps(self, steps = 1, M = None):
+        # All voters adjust at once, expressed = (1 - st) * (M @ expressed) + st * internal,
+        # M from get_influence_matrix unless given
+        M = M if M is not None else self.get_influence_matrix()
+        internal, expressed, _, stubbornness = self.get_voter_arrays()
+        for _ in range(steps):
+            expressed = (1 - stubbornness) * (M @ expressed) + stubbornness * internal
+        self.set_expressed_opinions(expressed)
+
+    def get_equilibrium_opinions(self, method = 'iterate', tol = 1e-10, max_steps = 100000, M = None):
+        # Fixed point of perform_synchronous_steps, solving
+        # (I - diag(1 - st) M) e = st * internal. 'iterate' steps from the current
+        # opinions until no opinion moves by more than tol, 'krylov' runs
+        # BiCGSTAB from them to relative residual tol (much faster when some
+        # voters are barely stubborn). A group of connected voters without any
+        # stubbornness has no unique fixed point, it then depends on the start.
+        # Raises ConvergenceError if tol is not reached within max_steps.
+        M = M if M is not None else self.get_influence_matrix()
+        internal, expressed, _, stubbornness = self.get_voter_arrays()
+        b = stubbornness * internal
+
+        def get_residual(opinions):
+            # Relative residual of the linear system
+            r = opinions - (1 - stubbornness) * (M @ opinions) - b
+            return np.linalg.norm(r) / max(np.linalg.norm(b), 1e-300)
+
+        if method == 'krylov':
+            import scipy.sparse as sp
+            import scipy.sparse.linalg as spla
+            A = sp.identity(self.V, format='csr') - sp.diags(1 - stubbornness) @ M
+            opinions, info = spla.bicgstab(A, b, x0=expressed, rtol=tol, maxiter=max_steps)
+            if info != 0:
+                raise ConvergenceError(f"BiCGSTAB did not converge (info {info}), "
+                                       f"relative residual {get_residual(opinions):.3g} > {tol}")
+            return opinions
+        if method != 'iterate':
+            raise ValueError(f"Unknown method {method}")
+        change = np.inf
+        for _ in range(max_steps):
+            new = (1 - stubbornness) * (M @ expressed) + b
+            change = np.max(np.abs(new - expressed))
+            if change <= tol:
+                return new
+            expressed = new
+        raise ConvergenceError(f"No fixed point after {max_steps} steps, last change {change:.3g} > {tol}, "
+                               f"relative residual {get_residual(expressed):.3g}")
+
+    def set_expressed_opinions(self, opinions):
+        # All votes may change, the tally is recounted when next asked for
+        self.vote_choices = None
+        if self.soa:
+            self.expressed_opinion[:] = opinions
+            return
+        for v, x in zip(self.voters, opinions):
+            v.expressed_opinion = float(x)
+
+    def simulate(self, max_steps = 1000, stride = 10, k = 20, tol = None, stable_snapshots = None,
+                 synchronous = False, rng = None) -> SimulationTrace:
+        # Runs up to max_steps steps (perform_edge_adjustment(k, rng), or
+        # synchronous steps) with a snapshot every stride steps and at the
+        # start. Stops early once no expressed opinion moved by more than tol
+        # since the last snapshot, or once the winner stayed the same for
+        # stable_snapshots snapshots in a row.
+        trace = SimulationTrace(-(-max_steps // stride) + 1, len(self.candidates))
+        M = self.get_influence_matrix() if synchronous else None
+        positions = {id(c): i for i, c in enumerate(self.candidates)}
+
+        def snapshot(step, previous):
+            opinions = self.get_voter_arrays()[1].copy()
+            result = self.get_voting_result()
+            shares = np.zeros(len(self.candidates))
+            for c, votes in result:
+                shares[positions[id(c)]] = votes
+            trace.record(step, shares / max(shares.sum(), 1), result[0][0].id, opinions, previous)
+            return opinions
+
+        opinions = snapshot(0, None)
+        step = 0
+        while step < max_steps:
+            steps = min(stride, max_steps - step)
+            if synchronous:
+                self.perform_synchronous_steps(steps, M)
+            else:
+                for _ in range(steps):
+                    self.perform_edge_adjustment(k, rng)
+            step += steps
+            opinions = snapshot(step, opinions)
+
+            if tol is not None and trace.max_change[trace.size - 1] <= tol:
+                break
+            if stable_snapshots is not None and trace.size >= stable_snapshots:
+                if np.all(trace.winners[trace.size - stable_snapshots:trace.size] == trace.winners[trace.size - 1]):
+                    break
+        trace.trim()
+        return trace
+
+    def perform_edge_adjustment(self, k = 20, rng = None):
+        # k random edges (with replacement) in random orientation, the first
+        # node adjusts to the second. rng is a np.random.Generator, the global
+        # numpy random state if None.
+        targets, sources = self.edge_index.sample(k, rng)
+        self.adjust_opinions(targets, sources)
+
+    def has_edge(self, u, v):
+        return self.edge_index.has_edge(u, v)
+
+    def add_edge(self, u, v):
+        # O(1), G follows if built
+        self.edge_index.add(u, v)
+        if self._G is not None:
+            self._G.add_edge(u, v)
+
+    def remove_edge(self, u, v):
+        self.edge_index.remove(u, v)
+        if self._G is not None:
+            self._G.remove_edge(u, v)
+
+    def perform_homophily_rewiring(self, k = 20, threshold = 0.3, rng = None):
+        # k random edges in random orientation, an edge whose nodes' expressed
+        # opinions differ by more than threshold is cut and its first node
+        # connects to a uniformly random node instead. The edge is kept if that
+        # node is the first node itself or already its neighbor. Returns the
+        # number of rewired edges.
+        rng = rng if rng is not None else np.random
+        targets, sources = self.edge_index.sample(k, rng)
+        others = (rng.random(k) * self.V).astype(np.int64)
+        opinions = self.expressed_opinion if self.soa else [v.expressed_opinion for v in self.voters]
+        rewired = 0
+        for u, v, w in zip(targets.tolist(), sources.tolist(), others.tolist()):
+            if abs(opinions[u] - opinions[v]) <= threshold or w == u:
+                continue
+            # Edges may have been cut before in this call
+            if not self.has_edge(u, v) or self.has_edge(u, w):
+                continue
+            self.remove_edge(u, v)
+            self.add_edge(u, w)
+            rewired += 1
+        return rewired
@@ -10,11 +10,23 @@ class UniformVoter(VoterFactory):
         v = Voter(id, np.random.uniform(0, 1), np.random.uniform(*self.charisma_dist), np.random.uniform(*self.stubbornness_dist))
         return v
 
+    def create_batch(self, n, rng = None):
+        rng = rng if rng is not None else np.random
+        return {
+            'internal_opinion': rng.uniform(0, 1, n),
+            'charisma': rng.uniform(*self.charisma_dist, n),
+            'stubbornness': rng.uniform(*self.stubbornness_dist, n),
+        }
+
 class UniformCandidate(CandidateFactory):
     def create(self, id):
         c = Candidate(id, np.random.uniform(0, 1))
         return c
 
+    def create_batch(self, n, rng = None):
+        rng = rng if rng is not None else np.random
+        return [Candidate(i, float(p)) for i, p in enumerate(rng.uniform(0, 1, n))]
+
 class FixedCandidate(CandidateFactory):
     def __init__(self, C):
         self.C = C
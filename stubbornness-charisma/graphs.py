@@ -0,0 +1,137 @@
+import numpy as np
+
+# Edge arrays are (E, 2) int64 arrays of simple undirected graphs on nodes
+# 0..n-1 with u < v in every row. rng is a np.random.Generator, the global
+# numpy random state if None.
+
+def get_edge_ids(u, v, n):
+    return np.minimum(u, v) * n + np.maximum(u, v)
+
+def from_edge_ids(ids, n):
+    return np.stack(np.divmod(ids, n), axis=1)
+
+def barabasi_albert_edges(n, m, rng = None):
+    # Preferential attachment after Batagelj and Brandes: slot 2j + 1 of M
+    # copies a uniformly random earlier slot, so nodes are picked proportionally
+    # to their degree. All draws are made at once and the copies resolved by
+    # following the chains of odd slots back to an even one. Self loops and
+    # multi-edges are dropped, so a few nodes end up with fewer than m edges.
+    rng = rng if rng is not None else np.random
+    slots = 2 * n * m
+    j = np.arange(1, slots, 2)
+    # Slot 2i holds node i // m, slot 2i + 1 copies slot r in [0, 2i]
+    r = (rng.random(len(j)) * j).astype(np.int64)
+    pos = r.copy()
+    odd = np.flatnonzero(pos % 2 == 1)
+    while len(odd) > 0:
+        pos[odd] = r[pos[odd] // 2]
+        odd = odd[pos[odd] % 2 == 1]
+
+    u = j // 2 // m
+    v = pos // 2 // m
+    keep = u != v
+    ids = np.unique(get_edge_ids(u[keep], v[keep], n))
+    return from_edge_ids(ids, n)
+
+def watts_strogatz_edges(n, k, p, rng = None):
+    # Ring lattice where every node is joined to its k // 2 nearest neighbors on
+    # each side, then the far end of every edge is rewired with probability p
+    # to a uniformly random node, redrawing self loops and duplicate edges
+    rng = rng if rng is not None else np.random
+    u = np.repeat(np.arange(n), k // 2)
+    v = (u + np.tile(np.arange(1, k // 2 + 1), n)) % n
+    rewire = rng.random(len(u)) < p
+    ids = get_edge_ids(u[~rewire], v[~rewire], n)
+    pending = u[rewire]
+    while len(pending) > 0:
+        w = (rng.random(len(pending)) * n).astype(np.int64)
+        new = get_edge_ids(pending, w, n)
+        _, first = np.unique(new, return_index=True)
+        valid = np.zeros(len(new), dtype=bool)
+        valid[first] = True
+        valid &= (w != pending) & ~np.isin(new, ids)
+        ids = np.concatenate([ids, new[valid]])
+        pending = pending[~valid]
+    return from_edge_ids(np.sort(ids), n)
+
+class EdgeIndex:
+    # Edges of a simple undirected graph on nodes 0..n-1 in the first size rows
+    # of array, in no particular order, for O(1) uniform sampling. Edges are
+    # added after the last row and removed by moving the last row into theirs.
+    # The given array is only copied on the first change, and slots (edge id ->
+    # row) is built then, so read-only and shared arrays can be indexed for free.
+    # Rows are kept with u < v, an array with other rows is copied sorted.
+    def __init__(self, edges, n):
+        self.n = n
+        self.array = edges
+        self.size = len(edges)
+        self.owned = False
+        self.slots = None
+        if len(edges) > 0 and np.any(edges[:, 0] > edges[:, 1]):
+            self.array = np.sort(edges, axis=1)
+            self.owned = True
+
+    @property
+    def edges(self):
+        return self.array[:self.size]
+
+    def __len__(self):
+        return self.size
+
+    def copy(self):
+        # Index on the same rows, both copy them before their next change
+        self.owned = False
+        return EdgeIndex(self.edges, self.n)
+
+    def get_slots(self):
+        if self.slots is None:
+            ids = get_edge_ids(self.edges[:, 0], self.edges[:, 1], self.n)
+            self.slots = dict(zip(ids.tolist(), range(self.size)))
+        return self.slots
+
+    def prepare_change(self):
+        # Own a writable array with room for one more edge
+        if not self.owned or self.size == len(self.array):
+            array = np.empty((max(2 * self.size, 16), 2), dtype=np.int64)
+            array[:self.size] = self.edges
+            self.array = array
+            self.owned = True
+        return self.get_slots()
+
+    def has_edge(self, u, v):
+        return min(u, v) * self.n + max(u, v) in self.get_slots()
+
+    def add(self, u, v):
+        assert u != v, f"Self loop at {u}"
+        slots = self.prepare_change()
+        edge_id = min(u, v) * self.n + max(u, v)
+        assert edge_id not in slots, f"Edge ({u}, {v}) exists"
+        self.array[self.size] = (min(u, v), max(u, v))
+        slots[edge_id] = self.size
+        self.size += 1
+
+    def remove(self, u, v):
+        slots = self.prepare_change()
+        row = slots.pop(min(u, v) * self.n + max(u, v))
+        last = self.size - 1
+        if row != last:
+            a, b = self.array[last]
+            self.array[row] = (a, b)
+            slots[int(get_edge_ids(a, b, self.n))] = row
+        self.size = last
+
+    def sample(self, k, rng = None):
+        # k uniformly random edges (with replacement) in uniformly random
+        # orientation as (first nodes, second nodes), from a single draw
+        rng = rng if rng is not None else np.random
+        r = (rng.random(k) * (2 * self.size)).astype(np.int64)
+        e = self.array[r >> 1]
+        flip = (r & 1).astype(bool)
+        return np.where(flip, e[:, 1], e[:, 0]), np.where(flip, e[:, 0], e[:, 1])
+
+def to_csr(edges, n):
+    # Symmetric 0/1 adjacency matrix, needs scipy
+    import scipy.sparse as sp
+    rows = np.concatenate([edges[:, 0], edges[:, 1]])
+    cols = np.concatenate([edges[:, 1], edges[:, 0]])
+    return sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, n))
\ No newline at end of file
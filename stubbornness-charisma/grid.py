@@ -0,0 +1,98 @@
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+
+from bases import World
+
+# Base world arrays put in shared memory, the workers only read them
+SHARED_ARRAYS = ('edges', 'internal_opinion', 'expressed_opinion', 'charisma', 'stubbornness')
+
+# Base world of a worker process, set by init_worker
+worker_world = None
+worker_blocks = None
+
+def share_arrays(arrays):
+    # Copies the arrays into new shared memory blocks, returns the blocks and
+    # the picklable {name: (block name, shape, dtype)} to attach to them
+    blocks = []
+    spec = {}
+    for name, a in arrays.items():
+        shm = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+        np.ndarray(a.shape, a.dtype, buffer=shm.buf)[...] = a
+        blocks.append(shm)
+        spec[name] = (shm.name, a.shape, a.dtype.str)
+    return blocks, spec
+
+def attach_arrays(spec):
+    # Read-only arrays on the blocks of share_arrays, the blocks must be kept
+    # open as long as the arrays are used
+    blocks = []
+    arrays = {}
+    for name, (block_name, shape, dtype) in spec.items():
+        shm = shared_memory.SharedMemory(name=block_name)
+        a = np.ndarray(shape, dtype, buffer=shm.buf)
+        a.flags.writeable = False
+        blocks.append(shm)
+        arrays[name] = a
+    return blocks, arrays
+
+def make_world(arrays, V, C, voting_rule, candidates) -> World:
+    # soa World on the SHARED_ARRAYS of a base world
+    world = World(V, C, voting_rule, soa=True)
+    for name, a in arrays.items():
+        setattr(world, name, a)
+    world.candidates = candidates
+    return world
+
+def init_worker(spec, *args):
+    global worker_world, worker_blocks
+    worker_blocks, arrays = attach_arrays(spec)
+    worker_world = make_world(arrays, *args)
+
+def run_cell(args, base = None):
+    # Clone of the base world with charisma and stubbornness scaled, after
+    # steps edge adjustments: the voting result as (candidate id, votes) and
+    # the expressed opinions
+    st_max, ch_max, steps, k, seed = args
+    world = (base if base is not None else worker_world).clone()
+    world.stubbornness *= st_max
+    world.charisma *= ch_max
+    rng = np.random.default_rng(seed)
+    for _ in range(steps):
+        world.perform_edge_adjustment(k, rng)
+    result = [(c.id, votes) for c, votes in world.get_voting_result()]
+    return result, world.expressed_opinion
+
+def run_grid(world: World, st_vals, ch_vals, steps = 1000, k = 20, seed = None, processes = None):
+    # Runs one clone of world per cell of the same shaped st_vals and ch_vals
+    # (e.g. from np.meshgrid), with stubbornness and charisma scaled by the
+    # cell values, on a pool of processes (in this process if processes is 1).
+    # Every cell gets its own seed from seed, so the results do not depend on
+    # the number of processes. Returns the voting results as an object array of
+    # the grid shape and the expressed opinions as a grid shape + (V,) array.
+    st_vals = np.asarray(st_vals, dtype=np.float64)
+    ch_vals = np.asarray(ch_vals, dtype=np.float64)
+    assert st_vals.shape == ch_vals.shape, "st_vals and ch_vals must have the same shape"
+    seeds = np.random.SeedSequence(seed).spawn(st_vals.size)
+    cells = [(st, ch, steps, k, s) for st, ch, s in zip(st_vals.ravel(), ch_vals.ravel(), seeds)]
+
+    arrays = dict(zip(SHARED_ARRAYS, (world.edges,) + world.get_voter_arrays()))
+    world_args = (world.V, world.C, world.voting_rule, world.candidates)
+    if processes == 1:
+        base = make_world(arrays, *world_args)
+        outputs = [run_cell(cell, base) for cell in cells]
+    else:
+        blocks, spec = share_arrays(arrays)
+        try:
+            with Pool(processes, initializer=init_worker, initargs=(spec,) + world_args) as pool:
+                outputs = pool.map(run_cell, cells)
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+    results = np.empty(st_vals.shape, dtype=object)
+    for cell, (result, _) in zip(np.ndindex(st_vals.shape), outputs):
+        results[cell] = result
+    opinions = np.stack([o for _, o in outputs]).reshape(st_vals.shape + (world.V,))
+    return results, opinions
\ No newline at end of file
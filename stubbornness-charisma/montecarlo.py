@@ -0,0 +1,119 @@
+from typing import List
+
+import numpy as np
+
+from bases import World, VoterFactory, Candidate
+from graphs import barabasi_albert_edges
+from votingrules import VotingRule, PluralityVoting, get_closest
+
+def get_wilson_interval(wins, n, z = 1.96):
+    # Wilson score interval of the success probability after wins successes in
+    # n trials, z = 1.96 for 95% confidence
+    wins = np.asarray(wins, dtype=np.float64)
+    if n == 0:
+        return np.zeros_like(wins), np.ones_like(wins)
+    p = wins / n
+    denom = 1 + z ** 2 / n
+    center = (p + z ** 2 / (2 * n)) / denom
+    half = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denom
+    return center - half, center + half
+
+class WinTally:
+    # Running count of the wins of every candidate (in candidates order) over
+    # the replicas run so far
+    def __init__(self, candidates: List[Candidate]):
+        self.candidates = candidates
+        self.wins = np.zeros(len(candidates), dtype=np.int64)
+        self.replicas = 0
+
+    def add(self, winners):
+        # winners holds the position of the winner of every replica
+        self.wins += np.bincount(winners, minlength=len(self.candidates))
+        self.replicas += len(winners)
+
+    def get_probabilities(self):
+        return self.wins / max(self.replicas, 1)
+
+    def get_intervals(self, z = 1.96):
+        # (low, high) arrays of the Wilson intervals of the win probabilities
+        return get_wilson_interval(self.wins, self.replicas, z)
+
+    def get_half_width(self, z = 1.96):
+        # Half the width of the widest interval
+        if self.replicas == 0:
+            return np.inf
+        low, high = self.get_intervals(z)
+        return float(np.max(high - low)) / 2
+
+class ReplicaBatch:
+    # R independent replicas of a soa World with V voters, stored as one soa
+    # World of R * V voters: replica r holds voters r * V .. (r + 1) * V - 1 and
+    # edges offsets[r] .. offsets[r + 1] - 1, each on its own BA graph. All
+    # replicas are stepped at once, pairs of different replicas never depend on
+    # each other so World.adjust_opinions runs them in large vectorized runs.
+    def __init__(self, R, V, voter_factory: VoterFactory, candidates: List[Candidate],
+                 voting_rule: VotingRule = None, BA_graph_param = 3, rng = None):
+        self.R = R
+        self.V = V
+        voting_rule = voting_rule if voting_rule is not None else PluralityVoting()
+        self.world = World(R * V, len(candidates), voting_rule, BA_graph_param, soa=True)
+        edges = [barabasi_albert_edges(V, BA_graph_param, rng) + r * V for r in range(R)]
+        self.offsets = np.cumsum([0] + [len(e) for e in edges])
+        self.world.edges = np.concatenate(edges)
+        attributes = voter_factory.create_batch(R * V, rng)
+        self.world.internal_opinion = np.array(attributes['internal_opinion'], dtype=np.float64)
+        self.world.expressed_opinion = self.world.internal_opinion.copy()
+        self.world.charisma = np.array(attributes['charisma'], dtype=np.float64)
+        self.world.stubbornness = np.array(attributes['stubbornness'], dtype=np.float64)
+        self.world.candidates = candidates
+
+    def perform_edge_adjustment(self, k = 20, rng = None):
+        # World.perform_edge_adjustment in every replica, k edges each
+        rng = rng if rng is not None else np.random
+        counts = np.diff(self.offsets)
+        # Edge and orientation from one draw as in EdgeIndex.sample, pair j of
+        # replica r at j * R + r keeps the order within replicas
+        r = (rng.random((k, self.R)) * (2 * counts)).astype(np.int64)
+        e = self.world.edges[self.offsets[:-1] + (r >> 1)]
+        flip = (r & 1).astype(bool)
+        self.world.adjust_opinions(np.where(flip, e[..., 1], e[..., 0]).ravel(), np.where(flip, e[..., 0], e[..., 1]).ravel())
+
+    def get_winners(self):
+        # Position in candidates of the winner of every replica, ties go to
+        # the lower id as in votingrules.get_result
+        candidates = self.world.candidates
+        opinions = self.world.expressed_opinion.reshape(self.R, self.V)
+        if type(self.world.voting_rule) is not PluralityVoting:
+            positions = {id(c): i for i, c in enumerate(candidates)}
+            return np.array([positions[id(self.world.voting_rule.get_voting_result(o, candidates)[0][0])]
+                             for o in opinions], dtype=np.int64)
+        C = len(candidates)
+        policies = np.array([c.internal_policy for c in candidates])
+        choices = get_closest(opinions.ravel(), policies)
+        votes = np.bincount(np.repeat(np.arange(self.R) * C, self.V) + choices, minlength=self.R * C).reshape(self.R, C)
+        ids = np.array([c.id for c in candidates])
+        leaders = votes == votes.max(axis=1, keepdims=True)
+        return np.argmin(np.where(leaders, ids, ids.max() + 1), axis=1)
+
+def estimate_win_probabilities(V, voter_factory: VoterFactory, candidates: List[Candidate],
+                               voting_rule: VotingRule = None, steps = 1000, k = 20, tol = 0.02, z = 1.96,
+                               batch = 64, min_replicas = 64, max_replicas = 100000, BA_graph_param = 3,
+                               seed = None) -> WinTally:
+    # Win probability of every candidate after steps edge adjustments, from
+    # batches of batch replicas until every Wilson interval has a half width
+    # of at most tol (after at least min_replicas replicas) or max_replicas
+    # replicas have run. Easy parameter points thus stop after a few batches
+    # and the replicas go to the close ones. Batch i draws from the i-th child
+    # of seed, so a result only depends on seed and the number of batches run.
+    tally = WinTally(candidates)
+    seeds = np.random.SeedSequence(seed)
+    while tally.replicas < max_replicas:
+        rng = np.random.default_rng(seeds.spawn(1)[0])
+        R = min(batch, max_replicas - tally.replicas)
+        replicas = ReplicaBatch(R, V, voter_factory, candidates, voting_rule, BA_graph_param, rng)
+        for _ in range(steps):
+            replicas.perform_edge_adjustment(k, rng)
+        tally.add(replicas.get_winners())
+        if tally.replicas >= min_replicas and tally.get_half_width(z) <= tol:
+            break
+    return tally
\ No newline at end of file
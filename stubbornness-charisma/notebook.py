@@ -39,11 +39,23 @@ from votingrules import *
 import generators
 reload(generators)
 from generators import *  
+import grid
+reload(grid)
+from grid import run_grid
+import montecarlo
+reload(montecarlo)
+from montecarlo import estimate_win_probabilities
+import os, sys
+# The repository root, Jupyter has no __file__ but runs in this directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(globals().get('__file__', 'notebook.py'))), '..'))
+import visualization
+reload(visualization)
+from visualization import GraphArtist, get_layout
 
 
 # %%
 def plot_degrees(G, ax=None):
-    pos = nx.nx_agraph.graphviz_layout(G, prog='neato')
+    pos = get_layout(G, 'neato')
     degrees = dict(G.degree())
 
     # Sort nodes by degree (in descending order)
@@ -66,8 +78,9 @@ def plot_degrees(G, ax=None):
 
 
 # %%
-def plot_votes(G, candidates: List[Candidate], ax=None):
-    pos = nx.nx_agraph.graphviz_layout(G, prog='neato')
+def plot_votes(G, candidates: List[Candidate], ax=None, artist=None):
+    # Returns the GraphArtist, passing it back for a later state of the same
+    # graph only updates the node colors and line widths
     all_votes = {node: G.nodes[node]['info'].cast_vote(candidates).id for node in G.nodes()}
 
     norm = Normalize(vmin=min([x.id for x in candidates]), vmax=max([x.id for x in candidates]))
@@ -82,29 +95,31 @@ def plot_votes(G, candidates: List[Candidate], ax=None):
         node_line_width = [np.interp(sv, [0, max_stub], [0.5, 4]) for sv in node_line_width]
     print([float(x) for x in node_line_width])
 
+    if artist is not None:
+        artist.update_nodes(colors=node_colors, linewidths=node_line_width)
+        return artist
+
     # Draw the graph
-    nx.draw(G, pos, ax=ax, 
-            with_labels=False, 
-            nodelist=G.nodes(), 
-            node_color=node_colors,
-            node_size=100, 
-            linewidths=node_line_width, 
-            edgecolors='black')
+    pos = get_layout(G, 'neato')
+    ax = ax if ax is not None else plt.gca()
+    artist = GraphArtist(G, pos, ax,
+                         nodelist=G.nodes(),
+                         node_color=node_colors,
+                         node_size=100,
+                         linewidths=node_line_width,
+                         edgecolors='black')
 
     sm = ScalarMappable(cmap=cmap, norm=norm)
     sm.set_array([])
     cbar = plt.colorbar(sm, ax=ax, orientation='vertical', shrink=0.6)
     cbar.set_label('Candidate ID')
     cbar.ax.yaxis.set_major_locator(MaxNLocator(integer=True))
+    return artist
 
 
 # %%
 def perform_edge_adjustment(world: World):
-    for e in random.choices(list(world.G.edges()), k=20):
-        choice = random.choice([0, 1])
-        chosen_nodeid = e[choice]
-        other_nodeid = e[1 - choice]
-        world.G.nodes[chosen_nodeid]['info'].adjust_opinion(world.G.nodes[other_nodeid]['info'])
+    world.perform_edge_adjustment(20)
     
 
 def get_results(world: World, repetitions=1000):
@@ -151,19 +166,19 @@ ch_vals, st_vals = np.meshgrid(np.linspace(0, 0.3, num_cols), np.linspace(0, 0.1
 fig, ax = plt.subplots(num_rows, num_cols, figsize=(11, 7), sharex=True, sharey=True)
 print(st_vals)
 print(ch_vals)
+# All cells at once on a process pool, each on a clone of base_world
+results, opinions = run_grid(base_world, st_vals, ch_vals, steps=1000, k=20, seed=0)
 for row in range(num_rows):
     for col in range(num_cols):
-        curr_world = copy.deepcopy(base_world)
         st_max = st_vals[row, col]
         ch_max = ch_vals[row, col]
+        curr_world = base_world.clone()
         for v in curr_world.voters:
             v.stubbornness *= st_max
             v.charisma *= ch_max
-        result_gen = get_results(curr_world, 1000)
-        # Skip 1st result because it is the initial state
-        next(result_gen)
-        result = next(result_gen)
-        print(f"Round with max stubbornness {st_max :.3f}: Candidate {result[0][0].id} won with {result[0][1]} votes")
+        curr_world.set_expressed_opinions(opinions[row, col])
+        result = results[row, col]
+        print(f"Round with max stubbornness {st_max :.3f}: Candidate {result[0][0]} won with {result[0][1]} votes")
         plot_votes(curr_world.G, curr_world.candidates, ax=ax[row, col])
 # Add column labels on top
 for j, ax_y in enumerate(ax[0]):
@@ -179,3 +194,16 @@ for i, ax_x in enumerate(ax[:, 0]):
 plt.savefig('ch-st.svg', bbox_inches='tight')
 
 # %%
+# Win probabilities with 95% intervals per max stubbornness, replicas are run
+# until every interval is within +-0.03
+C = 4
+V = 30
+candidates = FixedCandidate(C).create_batch(C)
+for st_max in np.linspace(0, 0.5, 6):
+    tally = estimate_win_probabilities(V, UniformVoter(stubbornness_dist=(0, st_max)), candidates,
+                                       steps=1000, tol=0.03, seed=0)
+    low, high = tally.get_intervals()
+    print(f"max stubbornness {st_max:.1f}, {tally.replicas} replicas: " +
+          ", ".join(f"{c.id}: {p:.2f} [{l:.2f}, {h:.2f}]" for c, p, l, h in zip(candidates, tally.get_probabilities(), low, high)))
+
+# %%
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from graphs import EdgeIndex, barabasi_albert_edges, watts_strogatz_edges
+
+def get_edge_set(edges):
+    return {(min(u, v), max(u, v)) for u, v in edges.tolist()}
+
+def check_index(index, expected):
+    assert len(index) == len(expected)
+    assert get_edge_set(index.edges) == expected
+    assert np.all(index.edges[:, 0] < index.edges[:, 1])
+    slots = index.get_slots()
+    assert len(slots) == len(expected)
+    for row, (u, v) in enumerate(index.edges.tolist()):
+        assert slots[u * index.n + v] == row
+
+def test_remove_from_reversed_rows():
+    index = EdgeIndex(np.array([[1, 0], [2, 1], [3, 2]]), 4)
+    index.remove(0, 1)
+    check_index(index, {(1, 2), (2, 3)})
+    index.remove(2, 3)
+    check_index(index, {(1, 2)})
+    index.remove(2, 1)
+    check_index(index, set())
+
+def test_random_changes_keep_the_index_consistent():
+    n = 30
+    rng = np.random.default_rng(0)
+    edges = barabasi_albert_edges(n, 2, rng)
+    # Mixed orientations, read-only as in shared memory
+    edges = np.where(rng.random((len(edges), 1)) < 0.5, edges, edges[:, ::-1])
+    edges.flags.writeable = False
+    index = EdgeIndex(edges, n)
+    expected = get_edge_set(edges)
+    for _ in range(2000):
+        u, v = map(int, rng.integers(n, size=2))
+        if u == v:
+            continue
+        if (min(u, v), max(u, v)) in expected:
+            index.remove(u, v)
+            expected.remove((min(u, v), max(u, v)))
+        else:
+            index.add(u, v)
+            expected.add((min(u, v), max(u, v)))
+        assert index.has_edge(v, u) == ((min(u, v), max(u, v)) in expected)
+    check_index(index, expected)
+
+def test_copy_is_independent():
+    index = EdgeIndex(np.array([[0, 1], [1, 2], [2, 3]]), 4)
+    other = index.copy()
+    index.remove(0, 1)
+    other.add(0, 3)
+    check_index(index, {(1, 2), (2, 3)})
+    check_index(other, {(0, 1), (1, 2), (2, 3), (0, 3)})
+
+def test_sample_covers_both_orientations():
+    index = EdgeIndex(np.array([[0, 1], [2, 3]]), 4)
+    first, second = index.sample(4000, np.random.default_rng(0))
+    pairs, counts = np.unique(np.stack([first, second], axis=1), axis=0, return_counts=True)
+    assert get_edge_set(pairs) == {(0, 1), (2, 3)} and len(pairs) == 4
+    assert counts.min() > 800
+
+@pytest.mark.parametrize('n, m', [(10, 1), (1000, 3)])
+def test_barabasi_albert_edges(n, m):
+    edges = barabasi_albert_edges(n, m, np.random.default_rng(1))
+    assert np.all(edges[:, 0] < edges[:, 1]) and edges.max() < n
+    assert len(get_edge_set(edges)) == len(edges) <= n * m
+
+def test_watts_strogatz_edges():
+    edges = watts_strogatz_edges(200, 6, 0.3, np.random.default_rng(2))
+    assert np.all(edges[:, 0] < edges[:, 1])
+    assert len(get_edge_set(edges)) == len(edges) == 200 * 3
\ No newline at end of file
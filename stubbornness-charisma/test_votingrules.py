@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from bases import Voter
+from generators import FixedCandidate
+from votingrules import PluralityVoting, BordaVoting, ApprovalVoting, InstantRunoffVoting
+
+RULES = [PluralityVoting(), BordaVoting(), ApprovalVoting(), InstantRunoffVoting()]
+
+def get_ids(result):
+    return [(c.id, votes) for c, votes in result]
+
+@pytest.mark.parametrize('rule', RULES, ids=lambda r: type(r).__name__)
+def test_no_voters(rule):
+    candidates = FixedCandidate(3).create_batch(3)
+    assert rule.get_voting_result(np.zeros(0), candidates) == []
+    assert rule.get_voting_result([], candidates) == []
+
+@pytest.mark.parametrize('rule', RULES, ids=lambda r: type(r).__name__)
+def test_array_and_voters_agree(rule):
+    rng = np.random.default_rng(0)
+    opinions = rng.uniform(0, 1, 200)
+    voters = [Voter(i, x, 0.5, 0.5) for i, x in enumerate(opinions)]
+    candidates = FixedCandidate(4).create_batch(4)
+    assert get_ids(rule.get_voting_result(opinions, candidates)) == get_ids(rule.get_voting_result(voters, candidates))
+
+def test_plurality_ties_go_to_the_earlier_candidate():
+    candidates = FixedCandidate(3).create_batch(3)
+    # 0.375 is halfway between candidates 0 (0.25) and 1 (0.5)
+    result = PluralityVoting().get_voting_result(np.array([0.375, 0.75]), candidates)
+    assert get_ids(result) == [(0, 1), (2, 1)]
+
+def test_instant_runoff_transfers_votes():
+    candidates = FixedCandidate(3).create_batch(3)
+    # 2 for candidate 0, 1 for 1, 2 for 2: 1 drops out and its voter, at 0.45,
+    # goes to 0
+    opinions = np.array([0.2, 0.25, 0.45, 0.75, 0.8])
+    result = InstantRunoffVoting().get_voting_result(opinions, candidates)
+    assert get_ids(result) == [(0, 3), (2, 2), (1, 1)]
\ No newline at end of file
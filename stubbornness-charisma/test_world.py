@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from bases import World, ConvergenceError
+from generators import UniformVoter, FixedCandidate
+from votingrules import PluralityVoting
+
+def make_world(V = 500, stubbornness_dist = (0, 0.1), seed = 0, soa = True) -> World:
+    world = World(V, 4, PluralityVoting(), soa=soa)
+    rng = np.random.default_rng(seed)
+    world.generate_candidates(FixedCandidate(4), rng)
+    np.random.seed(seed)
+    world.generate_voters(UniformVoter(stubbornness_dist=stubbornness_dist), rng if soa else None)
+    return world
+
+def check_tally(world):
+    expected = PluralityVoting().get_voting_result(world.get_voter_arrays()[1], world.candidates)
+    assert world.get_voting_result() == expected
+
+def test_equilibrium_methods_agree():
+    world = make_world()
+    a = world.get_equilibrium_opinions('iterate', tol=1e-12)
+    b = world.get_equilibrium_opinions('krylov', tol=1e-12)
+    assert np.allclose(a, b, atol=1e-8)
+
+@pytest.mark.parametrize('method', ['iterate', 'krylov'])
+def test_equilibrium_raises_without_convergence(method):
+    world = make_world(stubbornness_dist=(0, 0.01))
+    with pytest.raises(ConvergenceError, match='residual'):
+        world.get_equilibrium_opinions(method, max_steps=2)
+
+@pytest.mark.parametrize('soa', [True, False])
+def test_plurality_tally_matches_recount(soa):
+    world = make_world(V=300, soa=soa)
+    rng = np.random.default_rng(1)
+    check_tally(world)
+    for _ in range(20):
+        world.adjust_opinions(rng.integers(300, size=50), rng.integers(300, size=50))
+        check_tally(world)
+    world.set_expressed_opinions(rng.uniform(0, 1, 300))
+    check_tally(world)
+    clone = world.clone()
+    clone.adjust_opinions(rng.integers(300, size=200), rng.integers(300, size=200))
+    check_tally(clone)
+    check_tally(world)
+    # Voters changed one at a time, as the notebooks do
+    for v in world.voters[:100]:
+        v.expressed_opinion = 0.1
+    check_tally(world)
+
+def test_object_world_sees_direct_voter_changes():
+    world = make_world(V=300, soa=False)
+    world.get_voting_result()
+    for v in world.voters:
+        v.expressed_opinion = 0.1
+    assert [(c.id, votes) for c, votes in world.get_voting_result()] == [(0, 300)]
\ No newline at end of file
@@ -1,7 +1,35 @@
 from typing import Dict
 from abc import ABC, abstractmethod 
 
+import numpy as np
+
+def get_opinions(voters) -> np.ndarray:
+    # Expressed opinions of a list of voters, an array is taken as is
+    if isinstance(voters, np.ndarray):
+        return voters
+    return np.array([v.expressed_opinion for v in voters], dtype=np.float64)
+
+def get_closest(opinions, policies) -> np.ndarray:
+    # Index of the closest policy for every opinion. Ties are broken like
+    # Voter.cast_vote, i.e. min over the candidate list: the earlier candidate wins.
+    unique, first = np.unique(policies, return_index=True)
+    idx = np.searchsorted(unique, opinions)
+    left = np.maximum(idx - 1, 0)
+    right = np.minimum(idx, len(unique) - 1)
+    d_left = np.abs(unique[left] - opinions)
+    d_right = np.abs(unique[right] - opinions)
+    choose_left = (d_left < d_right) | ((d_left == d_right) & (first[left] < first[right]))
+    return first[np.where(choose_left, left, right)]
+
+def get_result(candidates, scores):
+    # [candidate, score] for candidates with a non-zero score, sorted by score,
+    # prioritizing lower ids in case of equality
+    votes = [[c, int(s)] for c, s in zip(candidates, scores) if s > 0]
+    votes.sort(key=lambda x: (x[1], -x[0].id), reverse=True)
+    return votes
+
 class VotingRule(ABC):
+    # voters is a list of voters or an array of their expressed opinions
     @abstractmethod
     def get_voting_result(self, voters, candidates) -> Dict:
         pass
@@ -9,16 +37,58 @@ class VotingRule(ABC):
 class PluralityVoting(VotingRule):
     
     def get_voting_result(self, voters, candidates):
-        # Implement plurality voting rule
-        votes = {}
-        for v in voters:
-            voted_cand = v.cast_vote(candidates)
-            if voted_cand.id in votes:
-                votes[voted_cand.id][1] += 1
-            else:
-                votes[voted_cand.id] = [voted_cand, 1]
-        votes = list(votes.values())
-        # Sort by number of votes, prioritizing lower ids in case of equality
-        votes.sort(key=lambda x: (x[1], -x[0].id), reverse=True)
-
-        return votes
\ No newline at end of file
+        # Every voter votes for the candidate with the closest policy
+        opinions = get_opinions(voters)
+        policies = np.array([c.internal_policy for c in candidates])
+        votes = np.bincount(get_closest(opinions, policies), minlength=len(candidates))
+        return get_result(candidates, votes)
+
+class BordaVoting(VotingRule):
+
+    def get_voting_result(self, voters, candidates):
+        # Every voter ranks the candidates by distance, the closest one gets
+        # C - 1 points and the farthest 0
+        opinions = get_opinions(voters)
+        policies = np.array([c.internal_policy for c in candidates])
+        dist = np.abs(policies[None, :] - opinions[:, None])
+        ranks = np.argsort(np.argsort(dist, axis=1, kind='stable'), axis=1, kind='stable')
+        points = (len(candidates) - 1 - ranks).sum(axis=0)
+        return get_result(candidates, points)
+
+class ApprovalVoting(VotingRule):
+
+    def __init__(self, radius = 0.1):
+        self.radius = radius
+
+    def get_voting_result(self, voters, candidates):
+        # Every voter approves of all candidates within radius of its opinion
+        opinions = get_opinions(voters)
+        policies = np.array([c.internal_policy for c in candidates])
+        approvals = (np.abs(policies[None, :] - opinions[:, None]) <= self.radius).sum(axis=0)
+        return get_result(candidates, approvals)
+
+class InstantRunoffVoting(VotingRule):
+
+    def get_voting_result(self, voters, candidates):
+        # Plurality rounds among the remaining candidates, the one with the
+        # fewest votes (the higher id on equality) drops out until one has a
+        # majority. The winner comes first, followed by the other candidates of
+        # the last round, then the dropped out ones in reverse order, each with
+        # its votes in the last round it took part in.
+        opinions = get_opinions(voters)
+        if len(opinions) == 0:
+            # No ballots, the same empty tally as the other rules
+            return get_result(candidates, np.zeros(len(candidates), dtype=np.int64))
+        policies = np.array([c.internal_policy for c in candidates])
+        remaining = list(range(len(candidates)))
+        dropped = []
+        while True:
+            votes = np.bincount(get_closest(opinions, policies[remaining]), minlength=len(remaining))
+            result = get_result([candidates[i] for i in remaining], votes)
+            if len(remaining) == 1 or 2 * result[0][1] > len(opinions):
+                break
+            # Candidates without votes are not in result and drop out first
+            last = min(range(len(remaining)), key=lambda i: (votes[i], -candidates[remaining[i]].id))
+            dropped.append([candidates[remaining[last]], int(votes[last])])
+            del remaining[last]
+        return result + [x for x in reversed(dropped) if x[1] > 0]
\ No newline at end of file
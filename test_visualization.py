@@ -0,0 +1,60 @@
+import importlib.util
+import io
+import json
+import os
+
+import networkx as nx
+import numpy as np
+import pytest
+
+plt = pytest.importorskip('matplotlib.pyplot')
+
+from visualization import GraphArtist, LayoutCache, get_available_prog, get_graph_key, get_layout
+
+@pytest.fixture(autouse=True)
+def agg_backend():
+    # Headless, whatever MPLBACKEND says
+    plt.switch_backend('Agg')
+    yield
+    plt.close('all')
+
+def make_graph() -> nx.Graph:
+    G = nx.erdos_renyi_graph(12, 0.4, seed=0)
+    for u, v in G.edges:
+        G.edges[u, v]['type'] = 'f' if (u + v) % 2 == 0 else 'e'
+    return G
+
+@pytest.mark.parametrize('prog', ['neato', 'kamada_kawai', 'spring'])
+def test_layout_is_cached(prog, tmp_path):
+    G = make_graph()
+    cache = LayoutCache(str(tmp_path))
+    pos = get_layout(G, prog, cache)
+    assert set(pos) == set(G.nodes)
+    # Read back from disk by a new cache, under the program actually used
+    path = cache.get_path(get_graph_key(G, get_available_prog(prog)))
+    assert len(json.load(open(path))) == len(G)
+    again = LayoutCache(str(tmp_path)).get(G, prog)
+    assert all(np.allclose(pos[node], again[node]) for node in G.nodes)
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+
+def test_graphviz_falls_back_to_spring(monkeypatch):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, 'find_spec', lambda name: None if name == 'pygraphviz' else find_spec(name))
+    assert get_available_prog('neato') == 'spring'
+    assert get_available_prog('kamada_kawai') == 'kamada_kawai'
+
+def test_graph_artist_draws_and_updates(tmp_path):
+    G = make_graph()
+    pos = get_layout(G, 'neato', LayoutCache(str(tmp_path)))
+    fig, ax = plt.subplots()
+    edges = list(G.edges)
+    artist = GraphArtist(G, pos, ax, edgelist=edges, node_size=100, edge_color='black', with_labels=True,
+                         edge_labels={e: 0 for e in edges}, label_pos=0.1)
+    artist.update_nodes(colors=['red'] * len(G), linewidths=[2] * len(G))
+    artist.update_edges(colors=['green' if G.edges[e]['type'] == 'f' else 'red' for e in edges],
+                        labels={e: i for i, e in enumerate(edges)})
+    artist.redraw()
+    assert artist.edge_labels[edges[-1]].get_text() == str(len(edges) - 1)
+    out = io.BytesIO()
+    fig.savefig(out, format='png')
+    assert out.getvalue().startswith(b'\x89PNG')
\ No newline at end of file
@@ -1,32 +1,49 @@
-import random
+import json
+import os
 
 import networkx as nx
 import numpy as np
 
-from utils import ListDict
+from utils import ListDict, RandomBuffer
 
 class NoFlipUniverse:
-    def __init__(self, G: nx.Graph):
+    # Optional recorder.FlipRecorder logging every round
+    recorder = None
+    # Rounds that picked a triangle and edges flipped so far
+    round_cnt = 0
+    flip_cnt = 0
+
+    def __init__(self, G: nx.Graph, rng: np.random.Generator | None = None):
+        # All randomness of the universe comes from rng
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.rand = RandomBuffer(self.rng)
+
         self.G = self.create_graph(G)
 
-        # Cache edge instability
-        for u, v in self.G.edges:
-            self.G.edges[u, v]['unstab'] = self.get_edge_unstab(u, v)
-        
-        # Keep track of unstable edges
+        # Keep track of unstable edges and of the third vertices of their
+        # unstable triangles
         self.unstab_edges = ListDict()
+        self.unstab_thirds = {}
         for u, v in self.G.edges:
-            if self.G.edges[u, v]['unstab'] > 0:
+            thirds = self.get_unstab_thirds(u, v)
+            # Cache edge instability
+            self.G.edges[u, v]['unstab'] = len(thirds)
+            if len(thirds) > 0:
                 self.unstab_edges.add(frozenset([u, v]))
+                self.unstab_thirds[frozenset([u, v])] = thirds
 
     def get_edge_unstab(self, u: int, v: int) -> int:
-        unstab_value = 0
+        # Recomputed like the cached 'unstab' and unstab_thirds, so the three agree
+        return len(self.get_unstab_thirds(u, v))
+
+    def get_unstab_thirds(self, u: int, v: int) -> ListDict:
+        thirds = ListDict()
         for w in self.G.nodes:
             if w == u or w == v:
                 continue
             if not self.is_stable_tri((u, v, w)):
-                unstab_value += 1
-        return unstab_value
+                thirds.add(w)
+        return thirds
     
     @classmethod
     def create_graph(cls, G: nx.Graph) -> nx.Graph:
@@ -61,29 +78,34 @@ class NoFlipUniverse:
     def flip_edge(self, u: int, v: int) -> None:
         assert frozenset([u, v]) in self.unstab_edges, f"Edge ({u}, {v}) is stable"
 
-        def increm_edge(u: int, v: int):
+        def increm_edge(u: int, v: int, w: int):
             assert self.G.edges[u, v]['unstab'] < len(self.G) - 2, f"Invalid increment of ({u}, {v})"
             self.G.edges[u, v]['unstab'] += 1
             if self.G.edges[u, v]['unstab'] == 1:
                 self.unstab_edges.add(frozenset([u, v]))
-        def decrem_edge(u: int, v: int):
+                self.unstab_thirds[frozenset([u, v])] = ListDict()
+            self.unstab_thirds[frozenset([u, v])].add(w)
+        def decrem_edge(u: int, v: int, w: int):
             assert self.G.edges[u, v]['unstab'] > 0, f"Invalid decrement of ({u}, {v})"
             self.G.edges[u, v]['unstab'] -= 1
             if self.G.edges[u, v]['unstab'] == 0:
                 self.unstab_edges.remove(frozenset([u, v]))
+                del self.unstab_thirds[frozenset([u, v])]
+            else:
+                self.unstab_thirds[frozenset([u, v])].remove(w)
 
         # Update edge instability
         for w in self.G.nodes:
             if w == u or w == v:
                 continue
             if self.is_stable_tri((u, v, w)):
-                increm_edge(u, v)
-                increm_edge(v, w)
-                increm_edge(u, w)
+                increm_edge(u, v, w)
+                increm_edge(v, w, u)
+                increm_edge(u, w, v)
             else:
-                decrem_edge(u, v)
-                decrem_edge(v, w)
-                decrem_edge(u, w)
+                decrem_edge(u, v, w)
+                decrem_edge(v, w, u)
+                decrem_edge(u, w, v)
 
         self.G.edges[u, v]['type'] = 'e' if self.G.edges[u, v]['type'] == 'f' else 'f'
 
@@ -91,35 +113,26 @@ class NoFlipUniverse:
         # Sample random edge from unstable edges
         if len(self.unstab_edges) == 0:
             return None
-        a, b = self.unstab_edges.choose_random()
+        edge = self.unstab_edges.choose_random(self.rand)
+        a, b = edge
 
         # Randomize order of a, b
-        a, b = random.choice([(a, b), (b, a)])
+        if self.rand.random() < 0.5:
+            a, b = b, a
 
-        # Find a random unstable triangle
-        perm = np.random.permutation(list(self.G.nodes))
-        for c in perm:
-            c = int(c)
-            if c == a or c == b:
-                continue
-            if not self.is_stable_tri((a, b, c)):
-                # Must exist
-                return (a, b, c)
-        assert False, f"No unstable triangle found along ({a}, {b})"
+        # Pick a random unstable triangle along (a, b)
+        c = self.unstab_thirds[edge].choose_random(self.rand)
+        return (a, b, c)
     
     @classmethod
     def push_away(cls, x, k):
         return (x ** k) / ((x ** k) + ((1 - x) ** k))
-    
-    def transform_round(self) -> tuple[()] | tuple[int, int] | None:
-        tri = self.get_random_unstab_tri()
-        if tri is None:
-            return None
-        
-        u, v, w = tri
-        # We work in unstable triangle tri from the point of view of u
-        # Either flip edge (u, v) or (u, w) according to friends of u
-        
+
+    def is_enemy(self, a: int, b: int) -> bool:
+        return self.G.edges[a, b]['type'] == 'e'
+
+    def count_friend_votes(self, u: int, v: int) -> tuple[int, int]:
+        # Friends of u (other than v) vote on (u, v) by agreeing with its type
         same_votes = 0
         total_friends = 0
         for a in self.G.neighbors(u):
@@ -133,13 +146,139 @@ class NoFlipUniverse:
             # Count votes for (u, v)
             if self.G.edges[a, v]['type'] == self.G.edges[u, v]['type']:
                 same_votes += 1
-        
+        return same_votes, total_friends
+
+    def get_change_prob(self, u: int, v: int) -> float:
+        # Probability that u flips (u, w) rather than (u, v)
+        same_votes, total_friends = self.count_friend_votes(u, v)
 
         # Intrinsic probability of flipping (u, v) is 0.5
         p_change_uw = (same_votes + 0.5) / (total_friends + 1)
-        p_change_uw = self.push_away(p_change_uw, 2)
+        return self.push_away(p_change_uw, 2)
+    
+    def get_party_sizes(self) -> tuple[int, int]:
+        # Node 0 and its friends against the rest, exact once balanced
+        A = 1 + sum(1 for a in self.G.neighbors(0) if self.G.edges[0, a]['type'] == 'f')
+        return tuple(sorted([A, len(self.G) - A]))
+
+    def is_balanced(self) -> bool:
+        return len(self.unstab_edges) == 0
+
+    def get_unstab_edge_count(self) -> int:
+        return len(self.unstab_edges)
+
+    def get_sign_matrix(self) -> np.ndarray:
+        # +1 friend, -1 enemy, 0 on the diagonal, nodes must be labelled 0..n-1
+        S = -np.ones((len(self.G), len(self.G)), dtype=np.int8)
+        np.fill_diagonal(S, 0)
+        for u, v in self.G.edges:
+            if self.G.edges[u, v]['type'] == 'f':
+                S[u, v] = S[v, u] = 1
+        return S
+
+    def get_state(self) -> dict:
+        # Arrays from which set_state restores the universe, see save. The
+        # complete graph follows from the node order and the friendships, the
+        # unstable edges and their thirds are kept in ListDict order.
+        edges = [tuple(edge) for edge in self.unstab_edges]
+        thirds = [self.unstab_thirds[frozenset(edge)].items for edge in edges]
+        return {
+            'nodes': np.array(list(self.G.nodes)),
+            'friend_edges': np.array([e for e in self.G.edges if self.G.edges[e]['type'] == 'f']).reshape(-1, 2),
+            'unstab_edges': np.array(edges).reshape(-1, 2),
+            'unstab_thirds': np.array([w for ws in thirds for w in ws]),
+            'unstab_offsets': np.cumsum([0] + [len(ws) for ws in thirds]),
+        }
+
+    def set_state(self, state: dict) -> None:
+        friend_G = nx.Graph()
+        friend_G.add_nodes_from(state['nodes'].tolist())
+        friend_G.add_edges_from(state['friend_edges'].tolist())
+        self.G = self.create_graph(friend_G)
+        nx.set_edge_attributes(self.G, 0, 'unstab')
+
+        self.unstab_edges = ListDict()
+        self.unstab_thirds = {}
+        offsets = state['unstab_offsets']
+        for i, (u, v) in enumerate(state['unstab_edges'].tolist()):
+            # get_random_unstab_tri unpacks edges in iteration order, which for
+            # colliding hashes depends on the insertion order
+            edge = frozenset([u, v])
+            if tuple(edge) != (u, v):
+                edge = frozenset([v, u])
+            thirds = ListDict()
+            for w in state['unstab_thirds'][offsets[i]:offsets[i + 1]].tolist():
+                thirds.add(w)
+            self.G.edges[u, v]['unstab'] = len(thirds)
+            self.unstab_edges.add(edge)
+            self.unstab_thirds[edge] = thirds
+
+    def save(self, path: str) -> None:
+        # Checkpoint to a .npz file: the state of the universe, its counters and
+        # its random state, so that a loaded universe continues exactly as this
+        # one would. Written to a temporary file first, a kill never leaves a
+        # partial checkpoint.
+        state = self.get_state()
+        state['class_name'] = type(self).__name__
+        if isinstance(self, ForceFlipUniverse):
+            state['enemy_priority'] = self.enemy_priority
+        state['round_cnt'] = self.round_cnt
+        state['flip_cnt'] = self.flip_cnt
+        state['rng_state'] = json.dumps(self.rng.bit_generator.state)
+        state['rand_values'] = np.array(self.rand.values)
+        state['rand_pos'] = self.rand.pos
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, **state)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path: str):
+        # Universe saved by save, nothing is recomputed
+        with np.load(path) as data:
+            state = {key: data[key] for key in data.files}
+        assert str(state['class_name']) == cls.__name__, f"{path} holds a {state['class_name']}"
+
+        U = cls.__new__(cls)
+        rng_state = json.loads(str(state['rng_state']))
+        U.rng = np.random.Generator(getattr(np.random, rng_state['bit_generator'])())
+        U.rand = RandomBuffer(U.rng, len(state['rand_values']))
+        # Set after the buffer took its first values
+        U.rng.bit_generator.state = rng_state
+        U.rand.values = state['rand_values'].tolist()
+        U.rand.pos = int(state['rand_pos'])
 
-        if np.random.random() < p_change_uw:
+        U.set_state(state)
+        if 'enemy_priority' in state:
+            U.enemy_priority = float(state['enemy_priority'])
+        U.round_cnt = int(state['round_cnt'])
+        U.flip_cnt = int(state['flip_cnt'])
+        return U
+
+    def attach_recorder(self, recorder) -> None:
+        # Log every following round to recorder, see recorder.FlipRecorder
+        recorder.start(self.get_sign_matrix())
+        self.recorder = recorder
+
+    def transform_round(self) -> tuple[()] | tuple[int, int] | None:
+        tri = self.get_random_unstab_tri()
+        if tri is None:
+            return None
+
+        res = self.resolve_tri(tri)
+        self.round_cnt += 1
+        if res:
+            self.flip_cnt += 1
+        if self.recorder is not None:
+            self.recorder.record(tri, res, self.get_unstab_edge_count())
+        return res
+
+    def resolve_tri(self, tri: tuple[int, int, int]) -> tuple[()] | tuple[int, int]:
+        u, v, w = tri
+        # We work in unstable triangle tri from the point of view of u
+        # Either flip edge (u, v) or (u, w) according to friends of u
+        p_change_uw = self.get_change_prob(u, v)
+
+        if self.rand.random() < p_change_uw:
             # Flip (u, w)
             self.flip_edge(u, w)
             return (u, w)
@@ -154,55 +293,32 @@ class NoFlipUniverse:
 
 class ForceFlipUniverse(NoFlipUniverse):
 
-    def __init__(self, G: nx.Graph, enemy_priority: float):
-        super().__init__(G)
+    def __init__(self, G: nx.Graph, enemy_priority: float, rng: np.random.Generator | None = None):
+        super().__init__(G, rng)
         self.enemy_priority = enemy_priority
 
-    def transform_round(self) -> tuple[()] | tuple[int, int] | None:
-        tri = self.get_random_unstab_tri()
-        if tri is None:
-            return None
-        
+    def resolve_tri(self, tri: tuple[int, int, int]) -> tuple[()] | tuple[int, int]:
         u, v, w = tri
         # We work in unstable triangle tri from the point of view of u
         # Either flip edge (u, v) or (u, w) according to friends of u
         
         # Incentivize friend edges to be picked in a 1-enemy triangle
-        def is_enemy(a, b):
-            return self.G.edges[a, b]['type'] == 'e'
         if self.get_tri_enemies((u, v, w)) == 1:
-            if random.random() < self.enemy_priority:
+            if self.rand.random() < self.enemy_priority:
                 # Pick the two friend edges to potentially flip
                 # (u, v) and (u, w) are friends, (u, w) is enemy
-                if is_enemy(u, v):
+                if self.is_enemy(u, v):
                     # u, v -> v, w
                     u, v, w = w, u, v
-                elif is_enemy(u, w):
+                elif self.is_enemy(u, w):
                     # u, w -> v, w
                     u, v, w = v, u, w
                 else:
                     # As is
                     pass
-        same_votes = 0
-        total_friends = 0
-        for a in self.G.neighbors(u):
-            if a == v:
-                continue
-            # Only care about friends of u
-            if self.G.edges[u, a]['type'] == 'e':
-                continue
-
-            total_friends += 1
-            # Count votes for (u, v)
-            if self.G.edges[a, v]['type'] == self.G.edges[u, v]['type']:
-                same_votes += 1
-        
-
-        # Intrinsic probability of flipping (u, v) is 0.5
-        p_change_uw = (same_votes + 0.5) / (total_friends + 1)
-        p_change_uw = self.push_away(p_change_uw, 2)
+        p_change_uw = self.get_change_prob(u, v)
 
-        if np.random.random() < p_change_uw:
+        if self.rand.random() < p_change_uw:
             # Flip (u, w)
             self.flip_edge(u, w)
             return (u, w)
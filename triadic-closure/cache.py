@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import time
+
+from experiments import BACKENDS, run_round
+
+# Sources whose changes invalidate the cached results
+SOURCE_FILES = ['base.py', 'matrix_base.py', 'packed_base.py', 'utils.py', 'experiments.py']
+
+def get_code_version() -> str:
+    # Hash of the simulation sources next to this file
+    digest = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in SOURCE_FILES:
+        with open(os.path.join(here, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def get_record(n, p_friend, p_favor_e=None, seed=None, backend='graph', stepping='round', sampling='edge',
+               **kwargs) -> dict:
+    # run_round as a JSON friendly record, kwargs are passed on
+    start = time.perf_counter()
+    round_cnt, flip_cnt, party_dist = run_round(n, p_friend, p_favor_e, seed, backend, stepping, sampling, **kwargs)
+    return {
+        'round_cnt': round_cnt,
+        'flip_cnt': flip_cnt,
+        'party_dist': list(party_dist),
+        'seconds': time.perf_counter() - start,
+    }
+
+class ResultCache:
+    # Content-addressed store of get_record results, one small JSON file per
+    # run under root, named by the hash of everything the run depends on.
+    # Reading a record touches its file, so once the files take more than
+    # max_bytes the ones with the oldest mtime, the least recently used, are
+    # evicted first.
+
+    def __init__(self, root: str = '.results-cache', max_bytes: int = 64 << 20):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.version = get_code_version()
+        os.makedirs(root, exist_ok=True)
+        self.size = sum(size for _, size, _ in self.get_entries())
+
+    def get_key(self, n, p_friend, p_favor_e=None, seed=None, backend='graph', stepping='round', sampling='edge') -> str:
+        assert seed is not None, "Only seeded runs can be cached"
+        model = BACKENDS[backend][p_favor_e is not None].__name__
+        key = json.dumps([model, n, p_friend, p_favor_e, seed, stepping, sampling, self.version])
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + '.json')
+
+    def get(self, key: str) -> dict | None:
+        path = self.get_path(key)
+        try:
+            with open(path) as f:
+                record = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        # Mark as recently used
+        os.utime(path)
+        return record
+
+    def put(self, key: str, record: dict) -> None:
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(record, f)
+        os.replace(path + '.tmp', path)
+        self.size += os.path.getsize(path)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def get_entries(self) -> list[tuple[float, int, str]]:
+        # (mtime, size, path) of all records
+        entries = []
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith('.json'):
+                    path = os.path.join(dirpath, name)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self) -> None:
+        # Drop least recently used records down to 3/4 of max_bytes, so that
+        # the directory is not scanned on every put
+        entries = sorted(self.get_entries())
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.size <= self.max_bytes * 3 // 4:
+                break
+            os.remove(path)
+            self.size -= size
+
+    def run(self, n, p_friend, p_favor_e=None, seed=None, backend='graph', stepping='round', sampling='edge') -> dict:
+        # get_record, computed only if not cached yet
+        key = self.get_key(n, p_friend, p_favor_e, seed, backend, stepping, sampling)
+        record = self.get(key)
+        if record is None:
+            record = get_record(n, p_friend, p_favor_e, seed, backend, stepping, sampling)
+            self.put(key, record)
+        return record
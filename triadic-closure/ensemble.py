@@ -0,0 +1,157 @@
+import numpy as np
+
+from base import NoFlipUniverse
+from matrix_base import MatrixNoFlipUniverse
+
+class UniverseEnsemble:
+    # R independent universes on n nodes advanced in lockstep, one triangle move
+    # per live universe and round. Follows NoFlipUniverse, or ForceFlipUniverse
+    # when enemy_priority is given. S is the (R, n, n) tensor of +-1 signs with
+    # a 0 diagonal, as in MatrixNoFlipUniverse.
+
+    def __init__(self, S: np.ndarray, enemy_priority: float | None = None, rng: np.random.Generator | None = None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.S = S
+        self.R, self.n = S.shape[0], S.shape[1]
+        self.enemy_priority = enemy_priority
+
+        # Cache edge instability
+        self.U = np.stack([MatrixNoFlipUniverse.get_unstab_matrix(S_r) for S_r in S])
+
+        # Unstable edges per row, every unstable edge is counted in both its rows
+        self.row_unstab = np.count_nonzero(self.U > 0, axis=2)
+
+        # Same counters as run_round
+        self.round_cnt = np.ones(self.R, dtype=np.int64)
+        self.flip_cnt = np.zeros(self.R, dtype=np.int64)
+
+    @classmethod
+    def from_random(cls, R: int, n: int, p_friend: float, enemy_priority: float | None = None,
+                    rng: np.random.Generator | None = None):
+        # R independent erdos_renyi_graph(n, p_friend) friendship graphs
+        rng = rng if rng is not None else np.random.default_rng()
+        A = np.triu(rng.random((R, n, n)) < p_friend, 1)
+        S = np.where(A | A.transpose(0, 2, 1), 1, -1).astype(np.int8)
+        S[:, np.arange(n), np.arange(n)] = 0
+        return cls(S, enemy_priority, rng)
+
+    def get_live(self) -> np.ndarray:
+        # Universes that still have an unstable triangle
+        return np.flatnonzero(self.row_unstab.sum(axis=1) > 0)
+
+    def choose_weighted(self, totals: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        # For every row of integer (or boolean) weights, a random column index
+        # drawn proportionally to its weight, totals being the row sums
+        k = (self.rng.random(len(totals)) * totals).astype(np.int64)
+        return np.argmax(np.cumsum(weights, axis=1) > k[:, None], axis=1)
+
+    def get_random_unstab_tris(self, live: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # One unstable triangle per live universe, sampled like
+        # NoFlipUniverse.get_random_unstab_tri
+        S, U = self.S, self.U
+        row_unstab = self.row_unstab[live]
+
+        # A random unstable edge in a random orientation is a random entry of U > 0
+        a = self.choose_weighted(row_unstab.sum(axis=1), row_unstab)
+        b = self.choose_weighted(row_unstab[np.arange(len(live)), a], U[live, a] > 0)
+
+        # Random third vertex closing an unstable triangle
+        unstab_w = S[live, a, b][:, None] * S[live, a] * S[live, b] < 0
+        c = self.choose_weighted(U[live, a, b], unstab_w)
+        return a, b, c
+
+    def get_change_probs(self, live: np.ndarray, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        # Vectorized NoFlipUniverse.get_change_prob
+        S = self.S
+        friends = S[live, u] > 0
+        friends[np.arange(len(live)), v] = False
+        total_friends = np.count_nonzero(friends, axis=1)
+        same_votes = np.count_nonzero(friends & (S[live, v] == S[live, u, v][:, None]), axis=1)
+
+        # Intrinsic probability of flipping (u, v) is 0.5
+        p_change_uw = (same_votes + 0.5) / (total_friends + 1)
+        return NoFlipUniverse.push_away(p_change_uw, 2)
+
+    def flip_edges(self, idx: np.ndarray, u: np.ndarray, v: np.ndarray) -> None:
+        # Flip edge (u[i], v[i]) in universe idx[i], all idx distinct
+        S, U = self.S, self.U
+        rows = np.arange(len(idx))
+
+        # +1 where (u, v, w) is stable and becomes unstable, -1 the other way round
+        delta = (S[idx, u, v][:, None] * S[idx, u] * S[idx, v]).astype(np.int32)
+        was_unstab_u = U[idx, :, u] > 0
+        was_unstab_v = U[idx, :, v] > 0
+
+        # Update edge instability
+        U[idx, u] += delta
+        U[idx, :, u] = U[idx, u]
+        U[idx, v] += delta
+        U[idx, :, v] = U[idx, v]
+        U[idx, u, v] += delta.sum(axis=1)
+        U[idx, v, u] = U[idx, u, v]
+
+        # Columns u and v changed in every row, rows u and v changed entirely
+        is_unstab_u = U[idx, :, u] > 0
+        is_unstab_v = U[idx, :, v] > 0
+        row_unstab = self.row_unstab[idx]
+        row_unstab += is_unstab_u.astype(np.int64) - was_unstab_u
+        row_unstab += is_unstab_v.astype(np.int64) - was_unstab_v
+        row_unstab[rows, u] = np.count_nonzero(is_unstab_u, axis=1)
+        row_unstab[rows, v] = np.count_nonzero(is_unstab_v, axis=1)
+        self.row_unstab[idx] = row_unstab
+
+        S[idx, u, v] *= -1
+        S[idx, v, u] *= -1
+
+    def transform_round(self) -> np.ndarray:
+        # Advance every live universe by one round, returns the universes
+        # that were advanced
+        live = self.get_live()
+        if len(live) == 0:
+            return live
+        u, v, w = self.get_random_unstab_tris(live)
+
+        if self.enemy_priority is not None:
+            # Incentivize friend edges to be picked in a 1-enemy triangle
+            e_uv = self.S[live, u, v] < 0
+            e_uw = self.S[live, u, w] < 0
+            e_vw = self.S[live, v, w] < 0
+            prioritize = (e_uv.astype(int) + e_uw + e_vw == 1) & (self.rng.random(len(live)) < self.enemy_priority)
+            # (u, v) enemy: u, v, w -> w, u, v; (u, w) enemy: u, v, w -> v, u, w
+            swap_uv = prioritize & e_uv
+            swap_uw = prioritize & e_uw
+            u, v, w = (np.where(swap_uv, w, np.where(swap_uw, v, u)),
+                       np.where(swap_uv | swap_uw, u, v),
+                       np.where(swap_uv, v, w))
+
+        p_change_uw = self.get_change_probs(live, u, v)
+        change_uw = self.rng.random(len(live)) < p_change_uw
+        if self.enemy_priority is None:
+            # Do not flip anything otherwise
+            flipped = change_uw
+            x, y = u[flipped], w[flipped]
+        else:
+            # Flip (u, v) instead
+            flipped = np.ones(len(live), dtype=bool)
+            x, y = u, np.where(change_uw, w, v)
+
+        self.flip_edges(live[flipped], x, y)
+        self.round_cnt[live] += 1
+        self.flip_cnt[live[flipped]] += 1
+        return live
+
+    def run(self) -> None:
+        while len(self.transform_round()) > 0:
+            pass
+
+    def get_party_sizes(self) -> np.ndarray:
+        # (R, 2) sorted party sizes of stable universes, as find_stable_distribution:
+        # the party of node 0 is node 0 together with its friends
+        A = 1 + np.count_nonzero(self.S[:, 0] > 0, axis=1)
+        return np.sort(np.stack([A, self.n - A], axis=1), axis=1)
+
+    def get_records(self) -> list[tuple[int, int, float | None, int, int]]:
+        # Per-universe (round_cnt, flip_cnt, p_favor_e, dist, n) rows as in run_rounds
+        dist = self.get_party_sizes()[:, 0]
+        return [(int(self.round_cnt[r]), int(self.flip_cnt[r]), self.enemy_priority, int(dist[r]), self.n)
+                for r in range(self.R)]
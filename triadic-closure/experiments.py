@@ -0,0 +1,85 @@
+import hashlib
+import os
+
+import networkx as nx
+import networkx.generators.random_graphs as r_graphs
+import numpy as np
+
+from base import NoFlipUniverse, ForceFlipUniverse
+from matrix_base import MatrixNoFlipUniverse, MatrixForceFlipUniverse
+from packed_base import PackedNoFlipUniverse, PackedForceFlipUniverse
+
+# (NoFlip, ForceFlip) universe classes per storage backend
+BACKENDS = {
+    'graph': (NoFlipUniverse, ForceFlipUniverse),
+    'matrix': (MatrixNoFlipUniverse, MatrixForceFlipUniverse),
+    'packed': (PackedNoFlipUniverse, PackedForceFlipUniverse),
+}
+
+def find_stable_distribution(G):
+    friend_G = nx.Graph()
+    friend_G.add_nodes_from(G.nodes)
+    for u, v in G.edges:
+        if G.edges[u, v]['type'] == 'f':
+            friend_G.add_edge(u, v)
+    conn = nx.node_connected_component(friend_G, 0)
+    A = len(conn)
+    res = [A, G.order() - A]
+
+    return tuple(sorted(res))
+
+def create_universe(G: nx.Graph, p_favor_e=None, backend='graph', rng=None, sampling='edge') -> NoFlipUniverse:
+    no_flip_cls, force_flip_cls = BACKENDS[backend]
+    if backend == 'matrix':
+        args = (rng, sampling)
+    else:
+        assert sampling == 'edge', f"The {backend} backend only samples edges"
+        args = (rng,)
+    if p_favor_e is None:
+        return no_flip_cls(G, *args)
+    return force_flip_cls(G, p_favor_e, *args)
+
+def get_task_seed(seed: int, n: int, p_friend: float, p_favor_e, replicate: int) -> int:
+    # Seed of a single run, depends only on its own parameters so that growing
+    # a sweep does not change the runs already in it
+    key = f"{n}-{p_friend!r}-{p_favor_e!r}-{replicate}".encode()
+    digest = int.from_bytes(hashlib.sha256(key).digest()[:8], 'little')
+    return int(np.random.SeedSequence([seed, digest]).generate_state(1)[0])
+
+# How a universe is stepped: one transform_round at a time, kmc skips the
+# rounds that flip nothing (MatrixNoFlipUniverse.kmc_round, same dynamics), sweep
+# resolves many triangles at once (MatrixNoFlipUniverse.sweep_round, a different
+# dynamics)
+STEPPINGS = ('round', 'kmc', 'sweep')
+
+def run_round(n, p_friend, p_favor_e=None, seed=None, backend='graph', stepping='round', sampling='edge',
+              checkpoint=None, checkpoint_every=100000):
+    # ForceFlip universes flip every round and step kmc as round. With a
+    # checkpoint path the universe is saved there every checkpoint_every
+    # rounds, and a run finding a checkpoint resumes from it.
+    assert stepping in STEPPINGS, f"Unknown stepping {stepping}"
+    if checkpoint is not None and os.path.exists(checkpoint):
+        U = BACKENDS[backend][p_favor_e is not None].load(checkpoint)
+    else:
+        rng = np.random.default_rng(seed)
+        G = r_graphs.erdos_renyi_graph(n, p_friend, seed=rng)
+        U = create_universe(G, p_favor_e, backend, rng, sampling)
+
+    if stepping == 'sweep':
+        assert isinstance(U, MatrixNoFlipUniverse), "sweep needs the matrix backend"
+        step = U.sweep_round
+    elif stepping == 'kmc' and p_favor_e is None:
+        assert isinstance(U, MatrixNoFlipUniverse), "kmc needs the matrix backend"
+        step = U.kmc_round
+    else:
+        step = U.transform_round
+
+    next_save = U.round_cnt + checkpoint_every
+    while step() is not None:
+        if checkpoint is not None and U.round_cnt >= next_save:
+            U.save(checkpoint)
+            next_save = U.round_cnt + checkpoint_every
+    if checkpoint is not None and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    # Counting the last round, which found the universe stable
+    return U.round_cnt + 1, U.flip_cnt, U.get_party_sizes()
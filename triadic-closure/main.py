@@ -1,20 +1,260 @@
-import networkx as nx
-import networkx.generators.random_graphs as r_graphs
-import numpy as np
-
-from base import NoFlipUniverse
-
-G = r_graphs.erdos_renyi_graph(50, 0.5)
-U = NoFlipUniverse(G)
-
-round_cnt = 1
-flip_cnt = 0
-while True:
-    res = U.transform_round()
-    if res is None:
-        break
-    if len(res) > 0:
-        # Edge flipped in round
-        flip_cnt += 1
-    round_cnt += 1
-print(f"Stabilized in {round_cnt} rounds with {flip_cnt} flips.")
\ No newline at end of file
+import argparse
+import csv
+import itertools
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cache import ResultCache, get_record
+from experiments import BACKENDS, STEPPINGS, get_task_seed
+
+COLUMNS = ['n', 'p_friend', 'p_favor_e', 'replicate', 'seed', 'backend', 'stepping', 'sampling', 'round_cnt', 'flip_cnt',
+           'dist', 'seconds']
+# Columns that tell the runs apart, in task order
+KEY_COLUMNS = COLUMNS[:8]
+
+def parse_favor_e(value: str):
+    # 'none' selects NoFlipUniverse, a probability selects ForceFlipUniverse
+    return None if value.lower() == 'none' else float(value)
+
+def run_task(task):
+    n, p_friend, p_favor_e, replicate, seed, backend, stepping, sampling, checkpoint, checkpoint_every = task
+    return get_record(n, p_friend, p_favor_e, seed, backend, stepping, sampling,
+                      checkpoint=checkpoint, checkpoint_every=checkpoint_every)
+
+def get_cache_key(cache, task):
+    n, p_friend, p_favor_e, replicate, seed, backend, stepping, sampling = task[:8]
+    return cache.get_key(n, p_friend, p_favor_e, seed, backend, stepping, sampling)
+
+def make_row(task, record):
+    n, p_friend, p_favor_e, replicate, seed, backend, stepping, sampling = task[:8]
+    return {
+        'n': n,
+        'p_friend': p_friend,
+        'p_favor_e': p_favor_e,
+        'replicate': replicate,
+        'seed': seed,
+        'backend': backend,
+        'stepping': stepping,
+        'sampling': sampling,
+        'round_cnt': record['round_cnt'],
+        'flip_cnt': record['flip_cnt'],
+        'dist': min(record['party_dist']),
+        'seconds': record['seconds'],
+    }
+
+class CsvSink:
+    # Appends rows and flushes after each one, so finished rows survive a kill
+    def __init__(self, path):
+        self.file = open(path, 'a+', newline='') if path is not None else sys.stdout
+        if self.file is not sys.stdout and self.file.tell() > 0:
+            self.file.seek(0)
+            header = self.file.readline().strip()
+            if header != ','.join(COLUMNS):
+                self.file.close()
+                raise ValueError(f"{path} has columns {header}, expected {','.join(COLUMNS)}")
+            self.file.seek(0, os.SEEK_END)
+        self.writer = csv.DictWriter(self.file, fieldnames=COLUMNS)
+        if self.file is sys.stdout or self.file.tell() == 0:
+            self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.file.flush()
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+class ParquetSink:
+    # Parquet needs its footer to be readable, so path is a dataset directory
+    # and every flush writes a complete part file into it (atomically, via a
+    # dot file that readers skip). Rows are flushed every batch_size rows or
+    # flush_every seconds and on close, a kill loses at most the unflushed
+    # rows, which a rerun computes again.
+    def __init__(self, path, batch_size=100, flush_every=60.0):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.pq = pq
+        if os.path.isfile(path):
+            raise ValueError(f"{path} is a file, parquet output is a directory of part files")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.schema = pa.schema([
+            ('n', pa.int64()), ('p_friend', pa.float64()), ('p_favor_e', pa.float64()),
+            ('replicate', pa.int64()), ('seed', pa.int64()), ('backend', pa.string()),
+            ('stepping', pa.string()), ('sampling', pa.string()), ('round_cnt', pa.int64()),
+            ('flip_cnt', pa.int64()), ('dist', pa.int64()), ('seconds', pa.float64()),
+        ])
+        self.batch_size = batch_size
+        self.flush_every = flush_every
+        self.last_flush = time.monotonic()
+        # Part names unique across runs writing to the same directory
+        self.prefix = f"part-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.parts = 0
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.rows:
+            return
+        name = f"{self.prefix}-{self.parts:05d}.parquet"
+        tmp = os.path.join(self.path, '.' + name + '.tmp')
+        self.pq.write_table(self.pa.Table.from_pylist(self.rows, schema=self.schema), tmp)
+        os.replace(tmp, os.path.join(self.path, name))
+        self.parts += 1
+        self.rows = []
+
+    def close(self):
+        self.flush()
+
+def get_done_key(row):
+    # KEY_COLUMNS of an output row, compared with the first fields of a task
+    p_favor_e = row['p_favor_e']
+    if isinstance(p_favor_e, str):
+        p_favor_e = parse_favor_e(p_favor_e or 'none')
+    elif p_favor_e is not None and p_favor_e != p_favor_e:
+        # NaN
+        p_favor_e = None
+    return (int(row['n']), float(row['p_friend']), p_favor_e, int(row['replicate']), int(row['seed']), row['backend'],
+            row['stepping'], row['sampling'])
+
+def read_done(path):
+    # Keys of the rows already in an existing CSV
+    done = set()
+    if path is None or not os.path.exists(path):
+        return done
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            done.add(get_done_key(row))
+    return done
+
+def read_parquet_done(path):
+    # Keys of the rows in the part files of a ParquetSink directory
+    import pyarrow.parquet as pq
+    done = set()
+    if not os.path.isdir(path):
+        return done
+    for name in sorted(os.listdir(path)):
+        if name.endswith('.parquet') and not name.startswith('.'):
+            part = os.path.join(path, name)
+            names = pq.read_schema(part).names
+            if names != COLUMNS:
+                raise ValueError(f"{part} has columns {','.join(names)}, expected {','.join(COLUMNS)}")
+            for row in pq.read_table(part, columns=KEY_COLUMNS).to_pylist():
+                done.add(get_done_key(row))
+    return done
+
+def raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parameter sweep over triadic closure universes.")
+    parser.add_argument('--n', type=int, nargs='+', default=[50], help="Numbers of nodes")
+    parser.add_argument('--p-friend', type=float, nargs='+', default=[0.5], help="Initial friendship probabilities")
+    parser.add_argument('--p-favor-e', type=parse_favor_e, nargs='+', default=[None],
+                        help="ForceFlip enemy priorities, 'none' for NoFlip")
+    parser.add_argument('--replicates', type=int, default=1, help="Runs per parameter combination")
+    parser.add_argument('--seed', type=int, default=0, help="Base seed of the sweep")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='graph')
+    parser.add_argument('--stepping', choices=STEPPINGS, default='round',
+                        help="'kmc' skips rounds that flip nothing (rejection-free), 'sweep' resolves many "
+                             "edge-disjoint triangles at once (a different dynamics), both matrix backend only")
+    parser.add_argument('--sampling', choices=['edge', 'triangle'], default='edge',
+                        help="Pick a uniform unstable edge (the model) or a uniform unstable triangle (matrix backend only)")
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help="Save unfinished runs here and resume them from there when rerun")
+    parser.add_argument('--checkpoint-every', type=int, default=100000, help="Rounds between checkpoints")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Result cache shared between sweeps, only runs missing from it are computed")
+    parser.add_argument('--cache-mb', type=int, default=64, help="Size bound of the result cache")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--out', default=None,
+                        help="Output .csv or .parquet directory of part files, both appended to with finished rows "
+                             "skipped, stdout if omitted")
+    parser.add_argument('--report-every', type=float, default=10.0, help="Seconds between progress reports")
+    args = parser.parse_args(argv)
+    if args.stepping != 'round' and args.backend != 'matrix':
+        parser.error(f"--stepping {args.stepping} needs --backend matrix")
+    if args.sampling != 'edge' and args.backend != 'matrix':
+        parser.error("--sampling triangle needs --backend matrix")
+    if args.stepping == 'kmc' and args.sampling != 'edge':
+        parser.error("--stepping kmc follows edge sampling")
+
+    if args.out is not None and args.out.endswith('.parquet'):
+        sink = ParquetSink(args.out)
+        done = read_parquet_done(args.out)
+    else:
+        done = read_done(args.out)
+        sink = CsvSink(args.out)
+
+    tasks = []
+    for n, p_friend, p_favor_e, replicate in itertools.product(args.n, args.p_friend, args.p_favor_e, range(args.replicates)):
+        seed = get_task_seed(args.seed, n, p_friend, p_favor_e, replicate)
+        if (n, p_friend, p_favor_e, replicate, seed, args.backend, args.stepping, args.sampling) in done:
+            continue
+        checkpoint = None
+        if args.checkpoint_dir is not None:
+            name = f"{args.backend}-{args.stepping}-{args.sampling}-{n}-{p_friend}-{p_favor_e}-{replicate}-{seed}.npz"
+            checkpoint = os.path.join(args.checkpoint_dir, name)
+        tasks.append((n, p_friend, p_favor_e, replicate, seed, args.backend, args.stepping, args.sampling,
+                      checkpoint, args.checkpoint_every))
+
+    if args.checkpoint_dir is not None:
+        os.makedirs(args.checkpoint_dir, exist_ok=True)
+
+    cache = None
+    if args.cache_dir is not None:
+        cache = ResultCache(args.cache_dir, args.cache_mb << 20)
+
+    # Treat SIGTERM like Ctrl-C so the sink gets closed
+    signal.signal(signal.SIGTERM, raise_interrupt)
+
+    start = time.perf_counter()
+    last_report = start
+    finished = 0
+    rounds = 0
+    executor = ProcessPoolExecutor(max_workers=args.workers)
+    try:
+        futures = {}
+        for task in tasks:
+            record = cache.get(get_cache_key(cache, task)) if cache is not None else None
+            if record is not None:
+                sink.write(make_row(task, record))
+                finished += 1
+            else:
+                futures[executor.submit(run_task, task)] = task
+        if cache is not None:
+            print(f"{finished}/{len(tasks)} runs from the cache", file=sys.stderr)
+        for future in as_completed(futures):
+            task = futures[future]
+            record = future.result()
+            if cache is not None:
+                cache.put(get_cache_key(cache, task), record)
+            row = make_row(task, record)
+            sink.write(row)
+            finished += 1
+            rounds += row['round_cnt']
+
+            now = time.perf_counter()
+            if now - last_report >= args.report_every or finished == len(tasks):
+                last_report = now
+                print(f"{finished}/{len(tasks)} runs, {rounds / (now - start):.0f} rounds/sec", file=sys.stderr)
+    except KeyboardInterrupt:
+        print(f"Interrupted after {finished}/{len(tasks)} runs", file=sys.stderr)
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise SystemExit(130)
+    finally:
+        sink.close()
+    executor.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,537 @@
+import networkx as nx
+import numpy as np
+
+from base import NoFlipUniverse, ForceFlipUniverse
+from utils import FenwickTree, IndexSet, RandomBuffer
+
+class MatrixNoFlipUniverse(NoFlipUniverse):
+    # Same model as NoFlipUniverse, but the complete signed graph is kept as a
+    # dense n x n matrix S (+1 friend, -1 enemy, 0 on the diagonal) and the edge
+    # instability counts as an n x n matrix U. Nodes must be labelled 0..n-1.
+    # Edges are identified by u * n + v with u < v.
+    #
+    # sampling='edge' picks a uniformly random unstable edge as NoFlipUniverse
+    # does. sampling='triangle' picks edges proportionally to their instability
+    # from a Fenwick tree, which makes the sampled triangle uniformly random
+    # among all unstable triangles (a different dynamics).
+
+    def __init__(self, G: nx.Graph, rng: np.random.Generator | None = None, sampling: str = 'edge'):
+        assert sampling in ('edge', 'triangle'), f"Unknown sampling {sampling}"
+        self.sampling = sampling
+
+        # All randomness of the universe comes from rng
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.rand = RandomBuffer(self.rng)
+
+        self.n = len(G)
+        self.S = self.create_matrix(G)
+
+        # Cache edge instability
+        self.U = self.get_unstab_matrix(self.S)
+
+        # Keep track of unstable edges
+        self.unstab_edges = IndexSet(self.n * self.n)
+        self.unstab_edges.add_many(np.flatnonzero(np.triu(self.U)))
+
+        # Instability counts indexed by edge id for triangle sampling
+        self.unstab_tree = None
+        if sampling == 'triangle':
+            self.unstab_tree = FenwickTree(np.triu(self.U).ravel())
+
+        # Cache friend counts and common friend counts for the vote tally
+        self.friend_cnt, self.common_friends = self.get_friend_counts(self.S)
+
+        # Live estimate of the two factions
+        self.init_factions()
+
+        # Per ordered unstable edge flip probabilities, only built for kmc_round
+        self.flip_weights = None
+
+    @classmethod
+    def create_matrix(cls, G: nx.Graph) -> np.ndarray:
+        n = len(G)
+        assert set(G.nodes) == set(range(n)), "Nodes must be labelled 0..n-1"
+        A = nx.to_numpy_array(G, nodelist=range(n), weight=None, dtype=np.int8)
+        # Complete graph with friend / enemy edges
+        S = np.where(A > 0, 1, -1).astype(np.int8)
+        np.fill_diagonal(S, 0)
+        return S
+
+    @classmethod
+    def get_unstab_matrix(cls, S: np.ndarray) -> np.ndarray:
+        # (S @ S)[u, v] sums S[u, w] * S[w, v] over all w != u, v (the diagonal
+        # is 0), so S[u, v] * (S @ S)[u, v] = #stable - #unstable triangles on
+        # (u, v). float32 keeps the product on BLAS and is exact for n < 2^24.
+        n = len(S)
+        Sf = S.astype(np.float32)
+        P = Sf @ Sf
+        U = ((n - 2) - S * P) / 2
+        U = U.astype(np.int32)
+        np.fill_diagonal(U, 0)
+        return U
+
+    @classmethod
+    def get_friend_counts(cls, S: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # friend_cnt[u] is the number of friends of u, common_friends[u, v] the
+        # number of nodes that are friends of both u and v
+        F = (S > 0).astype(np.float32)
+        friend_cnt = F.sum(axis=1).astype(np.int32)
+        common_friends = (F @ F).astype(np.int32)
+        return friend_cnt, common_friends
+
+    def to_graph(self) -> nx.Graph:
+        # Graph in the format of NoFlipUniverse.G, e.g. for draw_graph
+        G = nx.Graph()
+        for u, v in zip(*np.triu_indices(self.n, 1)):
+            u, v = int(u), int(v)
+            G.add_edge(u, v, type= 'f' if self.S[u, v] > 0 else 'e', unstab= int(self.U[u, v]))
+        return G
+
+    def get_sign_matrix(self) -> np.ndarray:
+        return self.S.copy()
+
+    def get_state(self) -> dict:
+        # The caches are saved as they are, the Fenwick tree is rebuilt from U
+        state = {
+            'S': self.S,
+            'U': self.U,
+            'unstab_edges': self.unstab_edges.items[:len(self.unstab_edges)],
+            'friend_cnt': self.friend_cnt,
+            'common_friends': self.common_friends,
+            'faction': self.faction,
+            'faction_size': self.faction_size,
+            'faction_frustration': self.faction_frustration,
+            'sampling': self.sampling,
+        }
+        if self.flip_weights is not None:
+            state['flip_weights'] = self.flip_weights
+            state['flip_row_weights'] = self.flip_row_weights
+            state['flip_weight_updates'] = self.flip_weight_updates
+        return state
+
+    def set_state(self, state: dict) -> None:
+        self.S = state['S']
+        self.U = state['U']
+        self.n = len(self.S)
+        self.sampling = str(state['sampling'])
+        self.unstab_edges = IndexSet(self.n * self.n)
+        self.unstab_edges.add_many(state['unstab_edges'])
+        self.unstab_tree = None
+        if self.sampling == 'triangle':
+            self.unstab_tree = FenwickTree(np.triu(self.U).ravel())
+        self.friend_cnt = state['friend_cnt']
+        self.common_friends = state['common_friends']
+        self.faction = state['faction']
+        self.faction_size = int(state['faction_size'])
+        self.faction_frustration = int(state['faction_frustration'])
+        self.flip_weights = None
+        if 'flip_weights' in state:
+            self.flip_weights = state['flip_weights']
+            self.flip_row_weights = state['flip_row_weights']
+            self.flip_weight_updates = int(state['flip_weight_updates'])
+
+    def get_edge_unstab(self, u: int, v: int) -> int:
+        return int(self.U[u, v])
+
+    def get_tri_enemies(self, tri: tuple[int, int, int]) -> int:
+        enemy_count = 0
+        for u, v in [(0, 1), (1, 2), (2, 0)]:
+            assert tri[u] != tri[v], "Triangle vertices must be distinct"
+            if self.S[tri[u], tri[v]] < 0:
+                enemy_count += 1
+        return enemy_count
+
+    def is_enemy(self, a: int, b: int) -> bool:
+        return self.S[a, b] < 0
+
+    def edge_id(self, u: int, v: int) -> int:
+        return min(u, v) * self.n + max(u, v)
+
+    def edge_ids(self, u: int, w: np.ndarray) -> np.ndarray:
+        # Ids of the edges (u, w[i])
+        return np.minimum(u, w) * self.n + np.maximum(u, w)
+
+    def flip_edge(self, u: int, v: int) -> None:
+        assert self.edge_id(u, v) in self.unstab_edges, f"Edge ({u}, {v}) is stable"
+        S, U = self.S, self.U
+
+        # +1 where (u, v, w) is stable and becomes unstable, -1 the other way
+        # round, 0 for w = u, v
+        delta = (S[u, v] * S[u] * S[v]).astype(np.int32)
+        was_unstab_u = U[u] > 0
+        was_unstab_v = U[v] > 0
+
+        # Update edge instability
+        U[u] += delta
+        U[:, u] = U[u]
+        U[v] += delta
+        U[:, v] = U[v]
+        U[u, v] += delta.sum()
+        U[v, u] = U[u, v]
+        assert U[u].min() >= 0 and U[v].min() >= 0, f"Invalid update along ({u}, {v})"
+        if self.unstab_tree is not None:
+            others = np.flatnonzero(delta)
+            self.unstab_tree.add(
+                np.concatenate([self.edge_ids(u, others), self.edge_ids(v, others), [self.edge_id(u, v)]]),
+                np.concatenate([delta[others], delta[others], [delta.sum()]]))
+
+        # Update friend counts, the only paths through (u, v) are u - v - y
+        # and y - u - v
+        d = 1 if S[u, v] < 0 else -1
+        CF = self.common_friends
+        friends_u = (S[u] > 0).astype(np.int32)
+        friends_v = (S[v] > 0).astype(np.int32)
+        CF[u] += d * friends_v
+        CF[v] += d * friends_u
+        CF[:, u] = CF[u]
+        CF[:, v] = CF[v]
+        self.friend_cnt[u] += d
+        self.friend_cnt[v] += d
+        CF[u, u] = self.friend_cnt[u]
+        CF[v, v] = self.friend_cnt[v]
+
+        S[u, v] = S[v, u] = -S[u, v]
+
+        # Only edges incident to u or v can change stability, (u, v) itself is
+        # handled from u's side
+        changed_u = np.flatnonzero((U[u] > 0) != was_unstab_u)
+        changed_v = np.flatnonzero((U[v] > 0) != was_unstab_v)
+        changed_v = changed_v[changed_v != u]
+        changed = np.concatenate([self.edge_ids(u, changed_u), self.edge_ids(v, changed_v)])
+        now_unstab = np.concatenate([U[u, changed_u], U[v, changed_v]]) > 0
+        self.unstab_edges.add_many(changed[now_unstab])
+        self.unstab_edges.remove_many(changed[~now_unstab])
+
+        self.repair_factions(u, v)
+        if self.flip_weights is not None:
+            self.update_flip_weights(u, v)
+
+    def get_random_unstab_tri(self) -> tuple[int, int, int] | None:
+        # Sample random edge from unstable edges
+        if len(self.unstab_edges) == 0:
+            return None
+        if self.unstab_tree is not None:
+            a, b = divmod(self.unstab_tree.choose_random(self.rand), self.n)
+        else:
+            a, b = divmod(self.unstab_edges.choose_random(self.rand), self.n)
+
+        # Randomize order of a, b
+        if self.rand.random() < 0.5:
+            a, b = b, a
+
+        # Pick a random third vertex closing an unstable triangle
+        cands = np.flatnonzero(self.S[a, b] * self.S[a] * self.S[b] < 0)
+        assert len(cands) > 0, f"No unstable triangle found along ({a}, {b})"
+        c = int(cands[self.rand.integers(len(cands))])
+        return (a, b, c)
+
+    def count_friend_votes(self, u: int, v: int) -> tuple[int, int]:
+        common = int(self.common_friends[u, v])
+        friends = int(self.friend_cnt[u])
+        if self.S[u, v] > 0:
+            # Friends of u agreeing on (u, v) are the common friends, v excluded
+            return common, friends - 1
+        # Friends of u agreeing on (u, v) are the enemies of v
+        return friends - common, friends
+
+    def init_factions(self) -> None:
+        # Signed 2-coloring of the nodes, node 0 with its friends against its
+        # enemies. Exact once the universe is balanced, in between it is
+        # repaired locally by flip_edge. faction_frustration is the number of
+        # edges whose sign disagrees with the coloring.
+        self.faction = self.S[0].copy()
+        self.faction[0] = 1
+        self.faction_size = int(np.count_nonzero(self.faction > 0))
+        disagree = self.S * self.faction[:, None] * self.faction[None, :] < 0
+        self.faction_frustration = int(np.count_nonzero(disagree)) // 2
+
+    def repair_factions(self, u: int, v: int) -> None:
+        if len(self.unstab_edges) == 0:
+            # Balanced, the coloring of node 0 is exact
+            self.init_factions()
+            return
+
+        c = self.faction
+        # The flipped edge toggled its own agreement with the coloring
+        self.faction_frustration += 1 if self.S[u, v] * c[u] * c[v] < 0 else -1
+
+        # Move u or v to the other faction if most of its edges disagree
+        for x in (u, v):
+            disagree = int(np.count_nonzero(self.S[x] * c * c[x] < 0))
+            if 2 * disagree > self.n - 1:
+                self.faction_frustration += (self.n - 1 - disagree) - disagree
+                self.faction_size -= int(c[x])
+                c[x] = -c[x]
+
+    def get_party_sizes(self) -> tuple[int, int]:
+        return tuple(sorted([self.faction_size, self.n - self.faction_size]))
+
+    def is_balanced(self) -> bool:
+        return len(self.unstab_edges) == 0
+
+    def get_change_probs(self, u: int) -> np.ndarray:
+        # get_change_prob(u, v) for every v, and get_change_prob(v, u) for every
+        # v by symmetry of S and common_friends
+        is_friend = self.S[u] > 0
+        same_votes = np.where(is_friend, self.common_friends[u], self.friend_cnt[u] - self.common_friends[u])
+        total_friends = self.friend_cnt[u] - is_friend
+        return self.push_away((same_votes + 0.5) / (total_friends + 1), 2)
+
+    def get_change_probs_to(self, v: int) -> np.ndarray:
+        # get_change_prob(u, v) for every u
+        is_friend = self.S[v] > 0
+        same_votes = np.where(is_friend, self.common_friends[v], self.friend_cnt - self.common_friends[v])
+        total_friends = self.friend_cnt - is_friend
+        return self.push_away((same_votes + 0.5) / (total_friends + 1), 2)
+
+    def init_flip_weights(self) -> None:
+        # flip_weights[u, v] is the probability that a round which picked the
+        # unstable edge (u, v) from u's side flips something
+        n = self.n
+        self.flip_weights = np.zeros((n, n))
+        for u in range(n):
+            self.flip_weights[u] = (self.U[u] > 0) * self.get_change_probs(u)
+        self.flip_row_weights = self.flip_weights.sum(axis=1)
+        self.flip_weight_updates = 0
+
+    def update_flip_weights(self, a: int, b: int) -> None:
+        # After flipping (a, b) only rows and columns a and b change
+        W = self.flip_weights
+        old_cols = W[:, [a, b]]
+        for x in (a, b):
+            W[x] = (self.U[x] > 0) * self.get_change_probs(x)
+            W[:, x] = (self.U[:, x] > 0) * self.get_change_probs_to(x)
+        self.flip_row_weights += (W[:, [a, b]] - old_cols).sum(axis=1)
+        self.flip_row_weights[[a, b]] = W[[a, b]].sum(axis=1)
+
+        # Recompute the running row sums from time to time to avoid drift
+        self.flip_weight_updates += 1
+        if self.flip_weight_updates >= self.n:
+            self.flip_row_weights = W.sum(axis=1)
+            self.flip_weight_updates = 0
+
+    def kmc_round(self) -> tuple[int, tuple[int, int]] | None:
+        # Rejection-free transform_round: jumps straight to the next round that
+        # flips an edge. Returns the number of rounds this stands for (null rounds
+        # included) with the flipped edge, or None if the universe is stable.
+        assert self.sampling == 'edge', "kmc_round follows edge sampling"
+        if len(self.unstab_edges) == 0:
+            return None
+        if self.flip_weights is None:
+            self.init_flip_weights()
+
+        # A round picks one of the 2 * E ordered unstable edges uniformly and
+        # then flips with probability flip_weights[u, v]
+        p_flip = self.flip_row_weights.sum() / (2 * len(self.unstab_edges))
+        rounds = int(self.rng.geometric(min(p_flip, 1.0)))
+
+        # Given that it flips, (u, v) is picked proportionally to its weight
+        u = self.choose_weighted(self.flip_row_weights)
+        v = self.choose_weighted(self.flip_weights[u])
+        cands = np.flatnonzero(self.S[u, v] * self.S[u] * self.S[v] < 0)
+        w = int(cands[self.rand.integers(len(cands))])
+
+        self.flip_edge(u, w)
+        self.round_cnt += rounds
+        self.flip_cnt += 1
+        if self.recorder is not None:
+            self.recorder.skip(rounds - 1)
+            self.recorder.record((u, v, w), (u, w), len(self.unstab_edges))
+        return rounds, (u, w)
+
+    def get_change_probs_at(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        # get_change_prob(u[i], v[i]) for every i
+        is_friend = self.S[u, v] > 0
+        common = self.common_friends[u, v]
+        same_votes = np.where(is_friend, common, self.friend_cnt[u] - common)
+        total_friends = self.friend_cnt[u] - is_friend
+        return self.push_away((same_votes + 0.5) / (total_friends + 1), 2)
+
+    def resolve_tris(self, u: np.ndarray, v: np.ndarray, w: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # resolve_tri for many triangles on the same signs, the edges to flip are
+        # returned rather than flipped, (-1, -1) where nothing flips
+        flip = self.rng.random(len(u)) < self.get_change_probs_at(u, v)
+        return np.where(flip, u, -1), np.where(flip, w, -1)
+
+    def get_disjoint_tris(self, a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+        # Mask of a maximal subset of the triangles sharing no edge. Luby style:
+        # every triangle left draws a priority and claims its three edges, the
+        # ones holding all of them are kept, and the ones sharing an edge with a
+        # kept triangle are dropped.
+        tri_edges = np.stack([self.edge_ids(a, b), self.edge_ids(b, c), self.edge_ids(a, c)], axis=1)
+        edges, slots = np.unique(tri_edges, return_inverse=True)
+        slots = slots.reshape(-1, 3)
+        taken = np.zeros(len(edges), dtype=bool)
+        active = np.ones(len(a), dtype=bool)
+        keep = np.zeros(len(a), dtype=bool)
+        while active.any():
+            idx = np.flatnonzero(active)
+            priority = self.rng.random(len(idx))
+            owner = np.full(len(edges), np.inf)
+            np.minimum.at(owner, slots[idx].ravel(), np.repeat(priority, 3))
+            won = idx[(owner[slots[idx]] == priority[:, None]).all(axis=1)]
+            keep[won] = True
+            taken[slots[won].ravel()] = True
+            active[idx] = ~taken[slots[idx]].any(axis=1)
+        return keep
+
+    @classmethod
+    def sum_by(cls, values: np.ndarray, groups: np.ndarray, count: int) -> np.ndarray:
+        # int32 sums of the rows of values per group, every group in 0..count-1
+        # must occur
+        order = np.argsort(groups, kind='stable')
+        starts = np.searchsorted(groups[order], np.arange(count))
+        return np.add.reduceat(values[order], starts, axis=0, dtype=np.int32)
+
+    def flip_edges(self, x: np.ndarray, y: np.ndarray) -> None:
+        # flip_edge for several distinct edges at once. With D the sparse change
+        # of the signs, S' @ S' - S @ S = D @ S + S' @ D, so the rows of U and
+        # common_friends of the touched nodes are updated in O(flips * n) array
+        # operations.
+        ids = self.edge_ids(x, y)
+        assert all(int(e) in self.unstab_edges for e in ids), "Flipped edges must be unstable"
+        assert len(np.unique(ids)) == len(ids), "Flipped edges must be distinct"
+        n, S, U, CF = self.n, self.S, self.U, self.common_friends
+
+        # D holds d at (r, c) for both orientations of each edge, A are the
+        # touched nodes with A[r_pos] = r and A[c_pos] = c
+        r = np.concatenate([x, y])
+        c = np.concatenate([y, x])
+        A, r_pos = np.unique(r, return_inverse=True)
+        c_pos = np.concatenate([r_pos[len(x):], r_pos[:len(x)]])
+        d = -2 * S[r, c]
+        # Friendships change by d / 2
+        f = d // 2
+
+        # (S @ S)[A] off the diagonal from the cached counts, plus (D @ S)[A]
+        old_U = U[A]
+        P = S[A] * ((n - 2) - 2 * old_U)
+        P += self.sum_by(d[:, None] * S[c], r_pos, len(A))
+        CF[A] += self.sum_by(f[:, None] * (S[c] > 0), r_pos, len(A))
+
+        S[x, y] = S[y, x] = -S[x, y]
+
+        # (S' @ D)[A] is zero outside of the columns A
+        SA = S[A]
+        P[:, A] += self.sum_by(d[:, None] * SA[:, r].T, c_pos, len(A)).T
+        CF[np.ix_(A, A)] += self.sum_by(f[:, None] * (SA[:, r] > 0).T, c_pos, len(A)).T
+        self.friend_cnt[A] = CF[A, A]
+
+        new_U = ((n - 2) - SA * P) // 2
+        new_U[np.arange(len(A)), A] = 0
+        U[A] = new_U
+        # Column by column is faster than U[:, A] = new_U.T
+        for i, a in enumerate(A):
+            U[:, a] = new_U[i]
+            CF[:, a] = CF[a]
+
+        in_A = np.zeros(n, dtype=bool)
+        in_A[A] = True
+        def edges_where(mask):
+            # Edges (A[i], j) where mask[i, j], edges within A taken once
+            rows, cols = np.nonzero(mask)
+            once = ~in_A[cols] | (A[rows] < cols)
+            return rows[once], cols[once]
+
+        if self.unstab_tree is not None:
+            rows, cols = edges_where(new_U != old_U)
+            self.unstab_tree.add(self.edge_ids(A[rows], cols), new_U[rows, cols] - old_U[rows, cols])
+        rows, cols = edges_where((new_U > 0) != (old_U > 0))
+        ids = self.edge_ids(A[rows], cols)
+        now_unstab = new_U[rows, cols] > 0
+        self.unstab_edges.add_many(ids[now_unstab])
+        self.unstab_edges.remove_many(ids[~now_unstab])
+
+        self.repair_factions_at(x, y)
+        # Rebuilt by the next kmc_round
+        self.flip_weights = None
+
+    def repair_factions_at(self, x: np.ndarray, y: np.ndarray) -> None:
+        # repair_factions after flipping all edges (x[i], y[i])
+        if len(self.unstab_edges) == 0:
+            self.init_factions()
+            return
+
+        c = self.faction
+        disagree = self.S[x, y] * c[x] * c[y] < 0
+        self.faction_frustration += 2 * int(np.count_nonzero(disagree)) - len(disagree)
+        for u in np.unique(np.concatenate([x, y])):
+            disagree = int(np.count_nonzero(self.S[u] * c * c[u] < 0))
+            if 2 * disagree > self.n - 1:
+                self.faction_frustration += (self.n - 1 - disagree) - disagree
+                self.faction_size -= int(c[u])
+                c[u] = -c[u]
+
+    def sweep_round(self, max_moves: int | None = None) -> tuple[int, list[tuple[int, int]]] | None:
+        # Synchronous variant of transform_round, a different dynamics: up to
+        # max_moves (n by default) unstable edges are sampled with an unstable
+        # triangle each, a maximal subset of triangles sharing no edge
+        # is resolved on the same signs, and all flips are applied together.
+        # Returns the number of resolved triangles with the flipped edges, or
+        # None if the universe is stable.
+        if len(self.unstab_edges) == 0:
+            return None
+        S, n = self.S, self.n
+        k = min(max_moves or n, len(self.unstab_edges))
+
+        # Duplicates are dropped, so slightly fewer than k edges
+        if self.unstab_tree is not None:
+            edges = np.unique([self.unstab_tree.choose_random(self.rand) for _ in range(k)])
+        else:
+            edges = np.unique(self.unstab_edges.items[self.rng.integers(len(self.unstab_edges), size=k)])
+        a, b = np.divmod(edges, n)
+
+        # Randomize order of a, b
+        swap = self.rng.random(len(edges)) < 0.5
+        a, b = np.where(swap, b, a), np.where(swap, a, b)
+
+        # Random third vertex closing an unstable triangle, the largest random
+        # key among the candidates
+        unstab = S[a, b][:, None] * S[a] * S[b] < 0
+        c = np.where(unstab, self.rng.random(unstab.shape, dtype=np.float32), -1).argmax(axis=1)
+
+        keep = self.get_disjoint_tris(a, b, c)
+        a, b, c = a[keep], b[keep], c[keep]
+        x, y = self.resolve_tris(a, b, c)
+        flipped = x >= 0
+        self.flip_edges(x[flipped], y[flipped])
+        self.round_cnt += len(a)
+        self.flip_cnt += int(np.count_nonzero(flipped))
+
+        if self.recorder is not None:
+            for tri, edge in zip(zip(a, b, c), zip(x, y)):
+                self.recorder.record(tri, edge if edge[0] >= 0 else (), len(self.unstab_edges))
+        return len(a), [(int(u), int(w)) for u, w in zip(x[flipped], y[flipped])]
+
+    def choose_weighted(self, weights: np.ndarray) -> int:
+        cum_weights = np.cumsum(weights)
+        idx = np.searchsorted(cum_weights, self.rand.random() * cum_weights[-1], side='right')
+        # Guard against rounding at the upper end
+        idx = min(int(idx), len(weights) - 1)
+        while weights[idx] <= 0:
+            idx -= 1
+        return idx
+
+
+class MatrixForceFlipUniverse(MatrixNoFlipUniverse, ForceFlipUniverse):
+    # ForceFlipUniverse dynamics on top of the matrix backend
+
+    def __init__(self, G: nx.Graph, enemy_priority: float, rng: np.random.Generator | None = None,
+                 sampling: str = 'edge'):
+        super().__init__(G, rng, sampling)
+        self.enemy_priority = enemy_priority
+
+    def resolve_tris(self, u: np.ndarray, v: np.ndarray, w: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # ForceFlipUniverse.resolve_tri for many triangles on the same signs
+        S = self.S
+        one_enemy = (S[u, v] < 0).astype(int) + (S[v, w] < 0) + (S[u, w] < 0) == 1
+        favor = one_enemy & (self.rng.random(len(u)) < self.enemy_priority)
+        # (u, v) enemy: u, v, w -> w, u, v, (u, w) enemy: u, v, w -> v, u, w
+        uv_enemy = favor & (S[u, v] < 0)
+        uw_enemy = favor & (S[u, w] < 0)
+        u, v, w = (np.where(uv_enemy, w, np.where(uw_enemy, v, u)),
+                   np.where(uv_enemy | uw_enemy, u, v),
+                   np.where(uv_enemy, v, w))
+
+        flip_uw = self.rng.random(len(u)) < self.get_change_probs_at(u, v)
+        return u, np.where(flip_uw, w, v)
@@ -35,28 +35,40 @@ from importlib import reload
 import base
 reload(base)
 from base import NoFlipUniverse, ForceFlipUniverse
+import ensemble
+reload(ensemble)
+from ensemble import UniverseEnsemble
+import experiments
+reload(experiments)
+from experiments import find_stable_distribution, get_task_seed, run_round
+import cache
+reload(cache)
+from cache import ResultCache, get_record
+import os, sys
+# The repository root, Jupyter has no __file__ but runs in this directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(globals().get('__file__', 'notebook.py'))), '..'))
+import visualization
+reload(visualization)
+from visualization import GraphArtist, get_layout
 
 
 # %%
-def draw_graph(G, pos):
+def draw_graph(G, pos, artist=None):
+    # Returns the GraphArtist, passing it back for later frames only updates
+    # the edge colors and labels
     clear_output(wait=True)
-    ec = ['green' if t == 'f' else 'red' for u, v, t in G.edges(data='type')]
-    el = {(u, v): G.edges[u, v]['unstab'] for u, v in G.edges}
-    nx.draw(G, pos, with_labels=True, node_color='skyblue', edge_color = ec, font_size=12, node_size=1000)
-    nx.draw_networkx_edge_labels(G, pos, edge_labels=el, label_pos=0.1)
-    plt.show()  # Redraw the figure
-
-def find_stable_distribution(G):
-    friend_G = nx.Graph()
-    friend_G.add_nodes_from(G.nodes)
-    for u, v in G.edges:
-        if G.edges[u, v]['type'] == 'f':
-            friend_G.add_edge(u, v)
-    conn = nx.node_connected_component(friend_G, 0)
-    A = len(conn)
-    res = [A, G.order() - A]
-    
-    return tuple(sorted(res))
+    edges = artist.edgelist if artist is not None else list(G.edges)
+    ec = ['green' if G.edges[u, v]['type'] == 'f' else 'red' for u, v in edges]
+    el = {(u, v): G.edges[u, v]['unstab'] for u, v in edges}
+    if artist is None:
+        fig, ax = plt.subplots()
+        artist = GraphArtist(G, pos, ax, edgelist=edges, node_color='skyblue', node_size=1000, edge_color=ec,
+                             with_labels=True, font_size=12, edge_labels=el, label_pos=0.1)
+        plt.close(fig)
+    else:
+        artist.update_edges(colors=ec, labels=el)
+    display(artist.ax.figure)  # Redraw the figure
+    return artist
 
 
 # %%
@@ -64,12 +76,11 @@ def find_stable_distribution(G):
 G = r_graphs.erdos_renyi_graph(22, 0.5)
 NFU = NoFlipUniverse(G)
 FFU = ForceFlipUniverse(G, 0.1)
-pos = nx.kamada_kawai_layout(NFU.G)
-draw_graph(NFU.G, pos)
+pos = get_layout(NFU.G, 'kamada_kawai')
+artist = draw_graph(NFU.G, pos)
 
 # %%
 # %matplotlib inline
-pos = nx.kamada_kawai_layout(NFU.G)
 round_i = 1
 while True:
     res = NFU.transform_round()
@@ -77,44 +88,42 @@ while True:
         break
     # print(res)
     round_i += 1
-draw_graph(NFU.G, pos)
+draw_graph(NFU.G, pos, artist)
 print(f"Stabilized in {round_i} rounds.")
 print(f"Distribution: {find_stable_distribution(NFU.G)}")
 
         
 
 # %%
-def run_round(n, p_friend, p_favor_e=None):
-    G = r_graphs.erdos_renyi_graph(n, p_friend)
-    if p_favor_e is None:
-        U = NoFlipUniverse(G)
-    else:
-        U = ForceFlipUniverse(G, p_favor_e)
-    round_cnt = 1
-    flip_cnt = 0
-    while True:
-        res = U.transform_round()
-        if res is None:
-            break
-        if len(res) > 0:
-            # Edge flipped in round
-            flip_cnt += 1
-        round_cnt += 1
-    return round_cnt, flip_cnt, find_stable_distribution(U.G)
-
-def run_rounds(rds, n, p_friend, p_favor_e=None):
+def run_rounds(rds, n, p_friend, p_favor_e=None, seed=0, cache=None):
+    # Replicate i is seeded by get_task_seed, replicates already in cache are
+    # not run again
     results = []
     for i in range(rds):
         print(f"{i+1}/{rds}")
-        rnd_cnt, flip_cnt, party_dist = run_round(n, p_friend, p_favor_e)
-        party_dist = min(party_dist)
-        results.append((rnd_cnt, flip_cnt, p_favor_e, party_dist, n))
+        task_seed = get_task_seed(seed, n, p_friend, p_favor_e, i)
+        if cache is None:
+            record = get_record(n, p_friend, p_favor_e, task_seed)
+        else:
+            record = cache.run(n, p_friend, p_favor_e, task_seed)
+        party_dist = min(record['party_dist'])
+        results.append((record['round_cnt'], record['flip_cnt'], p_favor_e, party_dist, n))
     df = pd.DataFrame(results, columns=['round_cnt', 'flip_cnt', 'p_favor_e', 'dist', 'n'])
     return df
 
+def run_rounds_ensemble(rds, n, p_friend, p_favor_e=None):
+    # Same records as run_rounds, all replicates advanced together
+    E = UniverseEnsemble.from_random(rds, n, p_friend, p_favor_e)
+    E.run()
+    df = pd.DataFrame(E.get_records(), columns=['round_cnt', 'flip_cnt', 'p_favor_e', 'dist', 'n'])
+    return df
+
+
+# %%
+results_cache = ResultCache()
 
 # %%
-df = run_rounds(20, 25, 0.5)
+df = run_rounds(20, 25, 0.5, cache=results_cache)
 df.describe()
 
 # %%
@@ -0,0 +1,297 @@
+import networkx as nx
+import numpy as np
+
+from base import NoFlipUniverse, ForceFlipUniverse
+from utils import FenwickTree, RandomBuffer
+
+if hasattr(np, 'bitwise_count'):
+    def popcounts(words: np.ndarray) -> np.ndarray:
+        return np.bitwise_count(words)
+else:
+    POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def popcounts(words: np.ndarray) -> np.ndarray:
+        # Set bits per uint64 word
+        return POPCOUNT_TABLE[words.view(np.uint8)].reshape(words.shape + (8,)).sum(axis=-1)
+
+def popcount(words: np.ndarray) -> int:
+    return int(popcounts(words).sum())
+
+def pack_rows(rows: np.ndarray) -> np.ndarray:
+    # Boolean (k, n) rows to (k, ceil(n / 64)) uint64 words, bit w of a row in
+    # bit w % 64 of word w // 64
+    n_words = (rows.shape[1] + 63) // 64
+    packed = np.packbits(rows, axis=1, bitorder='little')
+    packed = np.pad(packed, ((0, 0), (0, 8 * n_words - packed.shape[1])))
+    return packed.view('<u8')
+
+class PackedNoFlipUniverse(NoFlipUniverse):
+    # Same model as NoFlipUniverse for very large n. Row u of E holds the
+    # enemies of u as bits (1 enemy, 0 friend or u itself), so the universe
+    # takes n^2 / 8 bytes. Instability counts are not cached but computed from
+    # rows u and v by XOR and popcount, so a flip toggles two bits and an
+    # unstable edge is found by rejection sampling, O(n / 64) per try. Nodes
+    # must be labelled 0..n-1.
+    #
+    # With track_rows the number of unstable edges at every node is kept
+    # (row_unstab, in a Fenwick tree) for exact sampling and an exact
+    # get_unstab_edge_count. That costs O(n^3 / 64) to set up and O(n^2 / 64)
+    # per flip and round, about 5 s of setup at n = 4000, so it is only worth
+    # it for small n or runs that spend most rounds near balance.
+
+    def __init__(self, G: nx.Graph | None, rng: np.random.Generator | None = None,
+                 rows: np.ndarray | None = None, n: int | None = None, track_rows: bool = False):
+        # Either from the friendship graph G, or from packed rows of n nodes
+        # (see from_random)
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.rand = RandomBuffer(self.rng)
+
+        if rows is None:
+            n = len(G)
+            assert set(G.nodes) == set(range(n)), "Nodes must be labelled 0..n-1"
+            A = nx.to_numpy_array(G, nodelist=range(n), weight=None, dtype=bool)
+            is_enemy = ~A
+            np.fill_diagonal(is_enemy, False)
+            rows = pack_rows(is_enemy)
+        self.n = n
+        self.E = rows
+
+        # Bits that stand for nodes, the last word is padded with zeros
+        self.valid = pack_rows(np.ones((1, n), dtype=bool))[0]
+
+        # Number of rejected samples after which to check for balance
+        self.max_tries = max(64, n)
+        # Decayed numbers of tries and hits of rejection sampling, their ratio
+        # estimates the fraction of unstable edges
+        self.tries = 0.0
+        self.hits = 0.0
+
+        self.track_rows = track_rows
+        if track_rows:
+            self.set_row_unstab(self.count_row_unstab())
+
+    def set_row_unstab(self, row_unstab: np.ndarray) -> None:
+        self.row_unstab = row_unstab
+        self.row_tree = FenwickTree(row_unstab)
+
+    def get_row_unstab(self, u: int) -> np.ndarray:
+        # Instability of every edge (u, w), 0 for w = u, O(n^2 / 64)
+        differ = popcounts(self.E[u] ^ self.E).sum(axis=1, dtype=np.int64)
+        enemy = np.unpackbits(self.E[u].view(np.uint8), bitorder='little')[:self.n].astype(bool)
+        return np.where(enemy, self.n - differ, differ)
+
+    def count_row_unstab(self, chunk_words: int = 1 << 22) -> np.ndarray:
+        # Unstable edges at every node, computed for chunks of rows at once
+        words = self.E.shape[1]
+        chunk = max(1, chunk_words // max(1, self.n * words))
+        row_unstab = np.zeros(self.n, dtype=np.int64)
+        for start in range(0, self.n, chunk):
+            rows = self.E[start:start + chunk]
+            differ = popcounts(rows[:, None, :] ^ self.E[None, :, :]).sum(axis=2, dtype=np.int64)
+            enemy = np.unpackbits(rows.view(np.uint8), axis=1, bitorder='little')[:, :self.n].astype(bool)
+            row_unstab[start:start + chunk] = (np.where(enemy, self.n - differ, differ) > 0).sum(axis=1)
+        return row_unstab
+
+    @classmethod
+    def random_rows(cls, n: int, p_friend: float, rng: np.random.Generator) -> np.ndarray:
+        # Packed enemy rows of erdos_renyi_graph(n, p_friend) friendships, built
+        # one row at a time to never hold more than the packed matrix
+        E = np.zeros((n, (n + 63) // 64), dtype=np.uint64)
+        row = np.zeros((1, n), dtype=bool)
+        for u in range(n):
+            # Edges to earlier nodes were drawn in their rows
+            row[0, :u] = (E[:u, u >> 6] >> np.uint64(u & 63)) & np.uint64(1)
+            row[0, u] = False
+            row[0, u + 1:] = rng.random(n - u - 1, dtype=np.float32) >= p_friend
+            E[u] = pack_rows(row)[0]
+        return E
+
+    @classmethod
+    def from_random(cls, n: int, p_friend: float, *args, rng: np.random.Generator | None = None,
+                    track_rows: bool = False):
+        # Universe on a random friendship graph without building a networkx graph,
+        # args are passed on to the constructor (e.g. enemy_priority)
+        rng = rng if rng is not None else np.random.default_rng()
+        return cls(None, *args, rng=rng, rows=cls.random_rows(n, p_friend, rng), n=n, track_rows=track_rows)
+
+    def get_state(self) -> dict:
+        state = {'E': self.E, 'max_tries': self.max_tries, 'tries': self.tries, 'hits': self.hits}
+        if self.track_rows:
+            state['row_unstab'] = self.row_unstab
+        return state
+
+    def set_state(self, state: dict) -> None:
+        self.E = state['E']
+        self.n = int(self.E.shape[0])
+        self.valid = pack_rows(np.ones((1, self.n), dtype=bool))[0]
+        self.max_tries = int(state['max_tries'])
+        self.tries = float(state['tries'])
+        self.hits = float(state['hits'])
+        self.track_rows = 'row_unstab' in state
+        if self.track_rows:
+            self.set_row_unstab(np.array(state['row_unstab'], dtype=np.int64))
+
+    def get_bit(self, u: int, w: int) -> int:
+        return int(self.E[u, w >> 6] >> np.uint64(w & 63)) & 1
+
+    def toggle_bit(self, u: int, w: int) -> None:
+        self.E[u, w >> 6] ^= np.uint64(1 << (w & 63))
+
+    def get_sign_matrix(self) -> np.ndarray:
+        # Dense signs, needs n^2 bytes
+        bits = np.unpackbits(self.E.view(np.uint8), axis=1, bitorder='little')[:, :self.n]
+        S = np.where(bits > 0, -1, 1).astype(np.int8)
+        np.fill_diagonal(S, 0)
+        return S
+
+    def get_edge_unstab(self, u: int, v: int) -> int:
+        # Bits where rows u and v differ are the w with exactly one enemy edge
+        # towards u and v, w = u and w = v included if (u, v) is enemy
+        differ = popcount(self.E[u] ^ self.E[v])
+        if self.get_bit(u, v):
+            return self.n - differ
+        return differ
+
+    def get_unstab_thirds(self, u: int, v: int) -> np.ndarray:
+        # Words with the bits of the w closing an unstable triangle with (u, v)
+        thirds = self.E[u] ^ self.E[v]
+        if not self.get_bit(u, v):
+            return thirds
+        # The bits of u and v differ in rows u and v and drop out here
+        return ~thirds & self.valid
+
+    def get_tri_enemies(self, tri: tuple[int, int, int]) -> int:
+        enemy_count = 0
+        for u, v in [(0, 1), (1, 2), (2, 0)]:
+            assert tri[u] != tri[v], "Triangle vertices must be distinct"
+            enemy_count += self.get_bit(tri[u], tri[v])
+        return enemy_count
+
+    def is_enemy(self, a: int, b: int) -> bool:
+        return self.get_bit(a, b) == 1
+
+    def flip_edge(self, u: int, v: int) -> None:
+        if not self.track_rows:
+            assert self.get_edge_unstab(u, v) > 0, f"Edge ({u}, {v}) is stable"
+            self.toggle_bit(u, v)
+            self.toggle_bit(v, u)
+            return
+
+        # Flipping (u, v) toggles every triangle on it, so only the edges at u
+        # and v change their instability
+        before_u = self.get_row_unstab(u) > 0
+        before_v = self.get_row_unstab(v) > 0
+        assert before_u[v], f"Edge ({u}, {v}) is stable"
+        self.toggle_bit(u, v)
+        self.toggle_bit(v, u)
+        after_u = self.get_row_unstab(u) > 0
+        after_v = self.get_row_unstab(v) > 0
+
+        # Node w != u, v gains or loses the edges (w, u) and (w, v)
+        delta = after_u.astype(np.int64) - before_u + after_v - before_v
+        delta[u] = after_u.sum() - self.row_unstab[u]
+        delta[v] = after_v.sum() - self.row_unstab[v]
+        changed = np.flatnonzero(delta)
+        self.row_unstab[changed] += delta[changed]
+        self.row_tree.add(changed, delta[changed])
+
+    def is_balanced(self, chunk: int = 1024) -> bool:
+        if self.track_rows:
+            return self.row_tree.total == 0
+        # Balanced iff every row is row 0, complemented for the enemies of 0.
+        # O(n^2 / 64), done in chunks of rows to bound memory.
+        enemies_of_0 = np.unpackbits(self.E[0].view(np.uint8), bitorder='little')[:self.n].astype(bool)
+        for start in range(0, self.n, chunk):
+            rows = self.E[start:start + chunk]
+            expected = np.where(enemies_of_0[start:start + chunk, None], self.E[0] ^ self.valid, self.E[0])
+            if not np.array_equal(rows, expected):
+                return False
+        return True
+
+    def get_unstab_edge_count(self) -> int:
+        if self.track_rows:
+            # Every unstable edge is counted at both its nodes
+            return self.row_tree.total // 2
+        # Estimate from the recent rejection sampling, -1 before any round
+        if self.tries == 0:
+            return -1
+        return round(self.hits / self.tries * self.n * (self.n - 1) / 2)
+
+    def add_tries(self, tries: int, hits: int, decay: float = 1 / 64) -> None:
+        self.tries = (1 - decay) * self.tries + tries
+        self.hits = (1 - decay) * self.hits + hits
+
+    def get_random_unstab_edge(self) -> tuple[int, int] | None:
+        if self.track_rows:
+            if self.row_tree.total == 0:
+                return None
+            # A node by its number of unstable edges, then one of them
+            a = self.row_tree.choose_random(self.rand)
+            unstab = np.flatnonzero(self.get_row_unstab(a))
+            return a, int(unstab[self.rand.integers(len(unstab))])
+
+        tries = 0
+        while True:
+            for _ in range(self.max_tries):
+                # Random edge in random order, kept if unstable
+                tries += 1
+                a = self.rand.integers(self.n)
+                b = self.rand.integers(self.n - 1)
+                if b >= a:
+                    b += 1
+                if self.get_edge_unstab(a, b) > 0:
+                    self.add_tries(tries, 1)
+                    return a, b
+            # Many stable edges in a row, stop if there is no unstable one
+            if self.is_balanced():
+                self.add_tries(tries, 0)
+                return None
+            # Scan half as often, so that the O(n^2 / 64) scans stay a fixed
+            # fraction of the time spent on tries
+            self.max_tries *= 2
+
+    def get_random_unstab_tri(self) -> tuple[int, int, int] | None:
+        # A uniformly random unstable edge in random order, then a random third
+        edge = self.get_random_unstab_edge()
+        if edge is None:
+            return None
+        a, b = edge
+        thirds = self.get_unstab_thirds(a, b)
+        counts = popcounts(thirds)
+        total = int(counts.sum())
+        # Random set bit of thirds
+        k = self.rand.integers(total)
+        cum_counts = np.cumsum(counts)
+        word = int(np.searchsorted(cum_counts, k, side='right'))
+        if word > 0:
+            k -= int(cum_counts[word - 1])
+        bits = np.unpackbits(thirds[word:word + 1].view(np.uint8), bitorder='little')
+        c = 64 * word + int(np.flatnonzero(bits)[k])
+        return (a, b, c)
+
+    def get_friends(self, u: int) -> np.ndarray:
+        friends = ~self.E[u] & self.valid
+        friends[u >> 6] &= ~np.uint64(1 << (u & 63))
+        return friends
+
+    def count_friend_votes(self, u: int, v: int) -> tuple[int, int]:
+        friends = self.get_friends(u)
+        if self.get_bit(u, v):
+            # Friends of u agreeing on (u, v) are the enemies of v
+            return popcount(friends & self.E[v]), popcount(friends)
+        # Common friends, v itself is a friend of u and has its own bit clear
+        return popcount(friends & ~self.E[v]) - 1, popcount(friends) - 1
+
+    def get_party_sizes(self) -> tuple[int, int]:
+        # Node 0 and its friends against the rest, exact once balanced
+        A = 1 + popcount(self.get_friends(0))
+        return tuple(sorted([A, self.n - A]))
+
+
+class PackedForceFlipUniverse(PackedNoFlipUniverse, ForceFlipUniverse):
+    # ForceFlipUniverse dynamics on top of the packed backend
+
+    def __init__(self, G: nx.Graph | None, enemy_priority: float, rng: np.random.Generator | None = None,
+                 rows: np.ndarray | None = None, n: int | None = None, track_rows: bool = False):
+        super().__init__(G, rng, rows, n, track_rows)
+        self.enemy_priority = enemy_priority
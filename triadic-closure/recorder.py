@@ -0,0 +1,103 @@
+import os
+import tempfile
+
+import networkx as nx
+import numpy as np
+
+# One row per round: the sampled triangle, the flipped edge ((-1, -1) if
+# nothing flipped) and the number of unstable edges after the round (-1 for
+# universes that do not track it)
+EVENT_DTYPE = np.dtype([
+    ('round', np.int64),
+    ('tri', np.int32, 3),
+    ('edge', np.int32, 2),
+    ('unstab_edges', np.int64),
+])
+
+class FlipRecorder:
+    # Logs the rounds of a universe into a preallocated buffer that is appended
+    # to the file at path whenever it fills up. The initial signs are stored
+    # next to it in path + '.init.npy', so a log can be replayed later.
+    # Attach with NoFlipUniverse.attach_recorder.
+
+    def __init__(self, path: str | None = None, capacity: int = 1 << 16):
+        if path is None:
+            fd, path = tempfile.mkstemp(suffix='.flips')
+            os.close(fd)
+        self.path = path
+        self.buffer = np.empty(capacity, dtype=EVENT_DTYPE)
+        self.buffered = 0
+        self.spilled = 0
+        self.round_idx = 0
+        self.S0 = None
+
+    def start(self, S: np.ndarray) -> None:
+        self.S0 = S
+        np.save(self.path + '.init.npy', S)
+        # Start a new log
+        open(self.path, 'wb').close()
+        self.buffered = 0
+        self.spilled = 0
+        self.round_idx = 0
+
+    def record(self, tri: tuple[int, int, int], res: tuple[()] | tuple[int, int], unstab_edges: int) -> None:
+        if self.buffered == len(self.buffer):
+            self.flush()
+        self.buffer[self.buffered] = (self.round_idx, tri, res if res else (-1, -1), unstab_edges)
+        self.buffered += 1
+        self.round_idx += 1
+
+    def skip(self, rounds: int) -> None:
+        # Rounds that flipped nothing and are not logged individually
+        self.round_idx += rounds
+
+    def flush(self) -> None:
+        # Spill the buffered rounds to disk
+        with open(self.path, 'ab') as f:
+            f.write(self.buffer[:self.buffered].tobytes())
+        self.spilled += self.buffered
+        self.buffered = 0
+
+    @classmethod
+    def open(cls, path: str):
+        # Reopen a flushed log for replay
+        recorder = cls(path, capacity=1)
+        recorder.S0 = np.load(path + '.init.npy')
+        recorder.spilled = os.path.getsize(path) // EVENT_DTYPE.itemsize
+        recorder.round_idx = recorder.spilled
+        return recorder
+
+    def __len__(self):
+        return self.spilled + self.buffered
+
+    def get_events(self) -> np.ndarray:
+        # All recorded rounds, the spilled part is memory-mapped
+        buffered = self.buffer[:self.buffered]
+        if self.spilled == 0:
+            return buffered
+        spilled = np.memmap(self.path, dtype=EVENT_DTYPE, mode='r', shape=(self.spilled,))
+        if self.buffered == 0:
+            return spilled
+        return np.concatenate([spilled, buffered])
+
+    def get_signs(self, round_idx: int | None = None) -> np.ndarray:
+        # Sign matrix after the first round_idx rounds (all of them if None)
+        events = self.get_events()
+        if round_idx is not None:
+            events = events[events['round'] < round_idx]
+        edges = events['edge'][events['edge'][:, 0] >= 0]
+
+        # An edge flipped an odd number of times has the opposite sign
+        n = len(self.S0)
+        flips = np.bincount(np.minimum(edges[:, 0], edges[:, 1]) * n + np.maximum(edges[:, 0], edges[:, 1]),
+                            minlength=n * n).reshape(n, n)
+        flips = (flips + flips.T) % 2
+        return np.where(flips == 1, -self.S0, self.S0)
+
+    def get_friend_graph(self, round_idx: int | None = None) -> nx.Graph:
+        # Friendship graph after round_idx rounds, as taken by the universes
+        S = self.get_signs(round_idx)
+        G = nx.Graph()
+        G.add_nodes_from(range(len(S)))
+        G.add_edges_from(zip(*np.nonzero(np.triu(S > 0))))
+        return G
@@ -0,0 +1,165 @@
+import networkx as nx
+import networkx.generators.random_graphs as r_graphs
+import numpy as np
+import pytest
+
+from base import NoFlipUniverse, ForceFlipUniverse
+from matrix_base import MatrixNoFlipUniverse, MatrixForceFlipUniverse
+from packed_base import PackedNoFlipUniverse
+from utils import FenwickTree, IndexSet, RandomBuffer
+
+def make_matrix_universe(n = 14, seed = 0, sampling = 'edge', force_flip = False) -> MatrixNoFlipUniverse:
+    rng = np.random.default_rng(seed)
+    G = r_graphs.erdos_renyi_graph(n, 0.5, seed=rng)
+    if force_flip:
+        return MatrixForceFlipUniverse(G, 0.5, rng, sampling)
+    return MatrixNoFlipUniverse(G, rng, sampling)
+
+def get_friend_graph(S) -> nx.Graph:
+    G = nx.Graph()
+    G.add_nodes_from(range(len(S)))
+    G.add_edges_from(zip(*np.nonzero(np.triu(S > 0))))
+    return G
+
+def check_caches(U):
+    # Every cache of a matrix universe against a full recomputation
+    S = U.S
+    assert np.array_equal(U.U, MatrixNoFlipUniverse.get_unstab_matrix(S))
+    friend_cnt, common_friends = MatrixNoFlipUniverse.get_friend_counts(S)
+    assert np.array_equal(U.friend_cnt, friend_cnt)
+    assert np.array_equal(U.common_friends, common_friends)
+
+    expected = set(np.flatnonzero(np.triu(U.U)).tolist())
+    items = U.unstab_edges.items[:len(U.unstab_edges)]
+    assert set(items.tolist()) == expected and len(items) == len(expected)
+    assert np.array_equal(U.unstab_edges.item_to_position[items], np.arange(len(items)))
+    assert np.count_nonzero(U.unstab_edges.item_to_position >= 0) == len(items)
+
+    if U.unstab_tree is not None:
+        assert U.unstab_tree.total == int(np.triu(U.U).sum())
+        assert np.array_equal(U.unstab_tree.tree, FenwickTree(np.triu(U.U).ravel()).tree)
+    if U.flip_weights is not None:
+        for u in range(U.n):
+            assert np.allclose(U.flip_weights[u], (U.U[u] > 0) * U.get_change_probs(u))
+        assert np.allclose(U.flip_row_weights, U.flip_weights.sum(axis=1))
+
+    # The networkx universe on the same signs
+    R = NoFlipUniverse(get_friend_graph(S))
+    for u, v in R.G.edges:
+        assert R.G.edges[u, v]['unstab'] == U.U[u, v]
+    assert {tuple(sorted(e)) for e in R.unstab_edges} == {divmod(e, U.n) for e in expected}
+
+@pytest.mark.parametrize('sampling', ['edge', 'triangle'])
+@pytest.mark.parametrize('force_flip', [False, True])
+def test_transform_round_keeps_caches(sampling, force_flip):
+    U = make_matrix_universe(sampling=sampling, force_flip=force_flip)
+    check_caches(U)
+    for i in range(300):
+        if U.transform_round() is None:
+            break
+        if i % 20 == 0:
+            check_caches(U)
+    check_caches(U)
+
+def test_flip_edge_keeps_caches():
+    U = make_matrix_universe(seed=1)
+    rng = np.random.default_rng(1)
+    for _ in range(30):
+        if len(U.unstab_edges) == 0:
+            break
+        u, v = divmod(int(U.unstab_edges.items[rng.integers(len(U.unstab_edges))]), U.n)
+        U.flip_edge(u, v)
+        check_caches(U)
+
+@pytest.mark.parametrize('sampling', ['edge', 'triangle'])
+def test_sweep_round_keeps_caches(sampling):
+    U = make_matrix_universe(n=20, seed=2, sampling=sampling)
+    for _ in range(10):
+        if U.sweep_round() is None:
+            break
+        check_caches(U)
+
+def test_kmc_round_keeps_caches():
+    U = make_matrix_universe(seed=3)
+    for i in range(100):
+        if U.kmc_round() is None:
+            break
+        if i % 10 == 0:
+            check_caches(U)
+    check_caches(U)
+
+def test_index_set_matches_set():
+    rng = np.random.default_rng(4)
+    s = IndexSet(200)
+    expected = set()
+    for _ in range(300):
+        items = rng.choice(200, size=rng.integers(1, 20), replace=False)
+        present = np.array([x in expected for x in items.tolist()], dtype=bool)
+        if rng.random() < 0.5:
+            s.add_many(items[~present])
+            expected.update(items[~present].tolist())
+        else:
+            s.remove_many(items[present])
+            expected.difference_update(items[present].tolist())
+        x = int(rng.integers(200))
+        if rng.random() < 0.5:
+            s.add(x)
+            expected.add(x)
+        elif x in expected:
+            s.remove(x)
+            expected.remove(x)
+        assert set(s) == expected and len(s) == len(expected)
+        assert all((x in s) == (x in expected) for x in range(200))
+        if expected:
+            assert s.choose_random(RandomBuffer(rng)) in expected
+
+def test_fenwick_tree_matches_prefix_sums():
+    rng = np.random.default_rng(5)
+    weights = rng.integers(0, 5, size=37)
+    tree = FenwickTree(weights)
+    for _ in range(100):
+        idx = rng.integers(37, size=4)
+        delta = rng.integers(0, 4, size=4)
+        tree.add(idx, delta)
+        np.add.at(weights, idx, delta)
+        assert tree.total == weights.sum()
+        cum = np.cumsum(weights)
+        for t in range(0, int(cum[-1]), 7):
+            assert tree.find(t) == np.searchsorted(cum, t, side='right')
+
+def make_universes():
+    rng = np.random.default_rng(6)
+    G = r_graphs.erdos_renyi_graph(12, 0.5, seed=rng)
+    return [
+        NoFlipUniverse(G, np.random.default_rng(7)),
+        ForceFlipUniverse(G, 0.5, np.random.default_rng(7)),
+        MatrixNoFlipUniverse(G, np.random.default_rng(7)),
+        MatrixNoFlipUniverse(G, np.random.default_rng(7), 'triangle'),
+        MatrixForceFlipUniverse(G, 0.5, np.random.default_rng(7)),
+        PackedNoFlipUniverse(G, np.random.default_rng(7)),
+        PackedNoFlipUniverse(G, np.random.default_rng(7), track_rows=True),
+    ]
+
+@pytest.mark.parametrize('index', range(len(make_universes())))
+def test_save_load_continues_identically(index, tmp_path):
+    U = make_universes()[index]
+    for _ in range(20):
+        U.transform_round()
+    path = str(tmp_path / 'universe.npz')
+    U.save(path)
+    V = type(U).load(path)
+    for _ in range(200):
+        assert U.transform_round() == V.transform_round()
+    assert np.array_equal(U.get_sign_matrix(), V.get_sign_matrix())
+    assert (U.round_cnt, U.flip_cnt) == (V.round_cnt, V.flip_cnt)
+
+def test_save_load_continues_kmc(tmp_path):
+    U = make_matrix_universe(seed=8)
+    for _ in range(5):
+        U.kmc_round()
+    path = str(tmp_path / 'universe.npz')
+    U.save(path)
+    V = MatrixNoFlipUniverse.load(path)
+    for _ in range(30):
+        assert U.kmc_round() == V.kmc_round()
+    check_caches(V)
\ No newline at end of file
@@ -1,5 +1,29 @@
 import random
 
+import numpy as np
+
+class RandomBuffer(object):
+    # Scalar draws from a np.random.Generator, generated in bulk
+    def __init__(self, rng: np.random.Generator, size: int = 4096):
+        self.rng = rng
+        self.size = size
+        self.refill()
+
+    def refill(self):
+        self.values = self.rng.random(self.size).tolist()
+        self.pos = 0
+
+    def random(self) -> float:
+        if self.pos == len(self.values):
+            self.refill()
+        x = self.values[self.pos]
+        self.pos += 1
+        return x
+
+    def integers(self, high: int) -> int:
+        # Uniform in [0, high)
+        return min(int(self.random() * high), high - 1)
+
 class ListDict(object):
     def __init__(self):
         self.item_to_position = {}
@@ -18,8 +42,10 @@ class ListDict(object):
             self.items[position] = last_item
             self.item_to_position[last_item] = position
 
-    def choose_random(self):
-        return random.choice(self.items)
+    def choose_random(self, rand: RandomBuffer | None = None):
+        if rand is None:
+            return random.choice(self.items)
+        return self.items[rand.integers(len(self.items))]
     
     def __contains__(self, item):
         return item in self.item_to_position
@@ -28,4 +54,103 @@ class ListDict(object):
         return iter(self.items)
 
     def __len__(self):
-        return len(self.items)
\ No newline at end of file
+        return len(self.items)
+
+class IndexSet(object):
+    # Set of integers in [0, capacity) stored in arrays, ListDict without
+    # hashing: O(1) add, remove and uniform sampling
+    def __init__(self, capacity: int):
+        self.items = np.empty(capacity, dtype=np.int64)
+        self.item_to_position = np.full(capacity, -1, dtype=np.int64)
+        self.size = 0
+
+    def add(self, item):
+        if self.item_to_position[item] >= 0:
+            return
+        self.items[self.size] = item
+        self.item_to_position[item] = self.size
+        self.size += 1
+
+    def remove(self, item):
+        position = self.item_to_position[item]
+        self.item_to_position[item] = -1
+        self.size -= 1
+        if position != self.size:
+            last_item = self.items[self.size]
+            self.items[position] = last_item
+            self.item_to_position[last_item] = position
+
+    def add_many(self, items: np.ndarray):
+        # items must be distinct and not in the set yet
+        end = self.size + len(items)
+        self.items[self.size:end] = items
+        self.item_to_position[items] = np.arange(self.size, end)
+        self.size = end
+
+    def remove_many(self, items: np.ndarray):
+        # items must be distinct and in the set, the holes they leave are
+        # filled with the remaining items of the tail
+        end = self.size - len(items)
+        positions = self.item_to_position[items]
+        holes = positions[positions < end]
+        tail = self.items[end:self.size]
+        movers = tail[np.isin(tail, items, assume_unique=True, invert=True)]
+        self.items[holes] = movers
+        self.item_to_position[movers] = holes
+        self.item_to_position[items] = -1
+        self.size = end
+
+    def choose_random(self, rand: RandomBuffer | None = None):
+        if rand is None:
+            return int(self.items[random.randrange(self.size)])
+        return int(self.items[rand.integers(self.size)])
+
+    def __contains__(self, item):
+        return self.item_to_position[item] >= 0
+
+    def __iter__(self):
+        return iter(self.items[:self.size].tolist())
+
+    def __len__(self):
+        return self.size
+
+class FenwickTree(object):
+    # Prefix sums over non-negative integer weights, with O(log n) updates and
+    # O(log n) sampling of an index proportionally to its weight
+    def __init__(self, weights: np.ndarray):
+        n = len(weights)
+        self.n = n
+        # tree[i] (1-based) sums the weights in (i - lowbit(i), i]
+        idx = np.arange(1, n + 1)
+        prefix = np.concatenate([[0], np.cumsum(weights, dtype=np.int64)])
+        self.tree = np.zeros(n + 1, dtype=np.int64)
+        self.tree[1:] = prefix[idx] - prefix[idx - (idx & -idx)]
+        self.total = int(prefix[-1])
+        self.top_step = 1 << (n.bit_length() - 1) if n > 0 else 0
+
+    def add(self, idx: np.ndarray, delta: np.ndarray):
+        # weights[idx] += delta, idx may repeat
+        self.total += int(delta.sum())
+        idx = np.asarray(idx, dtype=np.int64) + 1
+        delta = np.asarray(delta, dtype=np.int64)
+        while len(idx) > 0:
+            np.add.at(self.tree, idx, delta)
+            idx = idx + (idx & -idx)
+            keep = idx <= self.n
+            idx, delta = idx[keep], delta[keep]
+
+    def find(self, t: int) -> int:
+        # Smallest index whose prefix sum (inclusive) exceeds t, for 0 <= t < total
+        pos = 0
+        step = self.top_step
+        tree = self.tree
+        while step > 0:
+            nxt = pos + step
+            if nxt <= self.n and tree[nxt] <= t:
+                pos = nxt
+                t -= tree[nxt]
+            step >>= 1
+        return pos
+
+    def choose_random(self, rand: RandomBuffer) -> int:
+        return self.find(rand.integers(self.total))
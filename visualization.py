@@ -0,0 +1,109 @@
+import hashlib
+import importlib.util
+import json
+import os
+
+import networkx as nx
+import numpy as np
+
+# Shared by the notebooks of both projects, which put the repository root on
+# sys.path. matplotlib is only needed for GraphArtist.
+
+# Graphviz programs run through pygraphviz, other layouts by networkx
+GRAPHVIZ_PROGS = ('neato', 'dot', 'fdp', 'sfdp', 'circo', 'twopi')
+
+def get_available_prog(prog: str) -> str:
+    # Graphviz programs fall back to the spring layout without pygraphviz
+    if prog in GRAPHVIZ_PROGS and importlib.util.find_spec('pygraphviz') is None:
+        return 'spring'
+    return prog
+
+def get_graph_key(G: nx.Graph, prog: str) -> str:
+    # Hash of the nodes, edges and layout program, attributes do not count
+    nodes = sorted(G.nodes)
+    edges = sorted(tuple(sorted(e)) for e in G.edges)
+    return hashlib.sha256(repr((prog, nodes, edges)).encode()).hexdigest()
+
+def compute_layout(G: nx.Graph, prog: str = 'neato') -> dict:
+    if prog in GRAPHVIZ_PROGS:
+        return nx.nx_agraph.graphviz_layout(G, prog=prog)
+    if prog == 'kamada_kawai':
+        return nx.kamada_kawai_layout(G)
+    if prog == 'spring':
+        return nx.spring_layout(G, seed=0)
+    assert False, f"Unknown layout {prog}"
+
+class LayoutCache:
+    # Node positions by get_graph_key, kept in memory and as one JSON file per
+    # graph under root, so a graph is laid out once across calls and sessions
+    # (a clone of a world has the same key as the world)
+
+    def __init__(self, root: str = '.layout-cache'):
+        self.root = root
+        self.layouts = {}
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.root, key + '.json')
+
+    def get(self, G: nx.Graph, prog: str = 'neato') -> dict:
+        prog = get_available_prog(prog)
+        key = get_graph_key(G, prog)
+        if key in self.layouts:
+            return self.layouts[key]
+        path = self.get_path(key)
+        if os.path.exists(path):
+            with open(path) as f:
+                pos = {node: np.array(xy) for node, xy in json.load(f)}
+        else:
+            pos = compute_layout(G, prog)
+            os.makedirs(self.root, exist_ok=True)
+            with open(path + '.tmp', 'w') as f:
+                json.dump([[node, [float(c) for c in xy]] for node, xy in pos.items()], f)
+            os.replace(path + '.tmp', path)
+        self.layouts[key] = pos
+        return pos
+
+default_cache = LayoutCache()
+
+def get_layout(G: nx.Graph, prog: str = 'neato', cache: LayoutCache | None = None) -> dict:
+    # Layout of G from cache (the default one in .layout-cache if None)
+    return (cache if cache is not None else default_cache).get(G, prog)
+
+class GraphArtist:
+    # A graph drawn once on ax, keeping the matplotlib collections so that
+    # later frames only update colors, line widths and labels. Node values are
+    # in nodelist order and edge values in edgelist order. kwargs go to
+    # nx.draw_networkx_nodes, e.g. node_size.
+
+    def __init__(self, G: nx.Graph, pos: dict, ax, nodelist=None, edgelist=None, node_color='skyblue',
+                 linewidths=None, edgecolors=None, edge_color='black', with_labels=False, font_size=12,
+                 edge_labels=None, label_pos=0.5, **kwargs):
+        self.ax = ax
+        self.nodelist = list(nodelist if nodelist is not None else G.nodes)
+        self.edgelist = list(edgelist if edgelist is not None else G.edges)
+        self.nodes = nx.draw_networkx_nodes(G, pos, ax=ax, nodelist=self.nodelist, node_color=node_color,
+                                            linewidths=linewidths, edgecolors=edgecolors, **kwargs)
+        self.edges = nx.draw_networkx_edges(G, pos, ax=ax, edgelist=self.edgelist, edge_color=edge_color,
+                                            arrows=False)
+        self.labels = nx.draw_networkx_labels(G, pos, ax=ax, font_size=font_size) if with_labels else {}
+        self.edge_labels = {}
+        if edge_labels is not None:
+            self.edge_labels = nx.draw_networkx_edge_labels(G, pos, ax=ax, edge_labels=edge_labels, label_pos=label_pos)
+        ax.set_axis_off()
+
+    def update_nodes(self, colors=None, linewidths=None):
+        if colors is not None:
+            self.nodes.set_facecolor(colors)
+        if linewidths is not None:
+            self.nodes.set_linewidths(linewidths)
+
+    def update_edges(self, colors=None, labels=None):
+        # labels maps edges as in edgelist to their new text
+        if colors is not None:
+            self.edges.set_color(colors)
+        if labels is not None:
+            for edge, label in labels.items():
+                self.edge_labels[edge].set_text(str(label))
+
+    def redraw(self):
+        self.ax.figure.canvas.draw_idle()
\ No newline at end of file